@@ -1,21 +1,143 @@
 import rpyc
+import pickle
+import socket
+from rpyc.core.stream import SocketStream
+from rpyc.core.channel import Channel
+import asyncio
+import functools
+import threading
+import contextlib
+import uuid
+from concurrent.futures import Future
+from pylabnet.core.transport import decode_result, shm_available, TRANSPORT_KW
+from pylabnet.core.transport import available_codecs, choose_codec, compress_args, CompressionStats
 
 
 class ClientBase:
-    def __init__(self, host, port):
+
+    # Max delay [s] between reconnection attempts after the link was lost
+    reconnect_max_delay = 30
+
+    def __init__(self, host, port, shm=None, compress=None, heartbeat=None, local_service=None):
+        """Instantiate client and connect to the server
+
+        :param host: (str) server host
+        :param port: (int) server port
+        :param shm: (bool) use shared memory to receive large arrays:
+                        None - automatically, if server runs on the same host
+                        True/False - force on/off
+        :param compress: (bool) compress large payloads (arrays, bytes):
+                        None - automatically, if server runs on a different host
+                        True/False - force on/off
+        :param heartbeat: (float) [optional] heartbeat interval [s].
+                        If given, the link is checked in background: when the
+                        server does not answer within the interval, pending and
+                        new calls fail with ConnectionLostError and the client
+                        reconnects in background with exponential backoff.
+                        While a call is in progress, the server is pinged over
+                        a separate connection (the server serves one request
+                        per connection at a time, a ping would wait for a long
+                        call to finish). With a bounded worker pool on the
+                        server (GenericServer max_workers), keep a worker free
+                        for it.
+                        None - no heartbeat (dead server is noticed by the next
+                        call, which can hang up to sync_request_timeout)
+        :param local_service: (ServiceBase) [optional] service instance living
+                        in this process: calls go to it directly, host and port
+                        are ignored. Use local_client() instead of passing it.
+        """
 
         # Internal vars to store server info
         self._host = ''
         self._port = 0
 
-        # Internal vars to store refs to server
+        # Shared-memory transport preference
+        self._shm = shm
+
+        # Compression preference, negotiated codec,
+        # and client-side compression counters
+        self._compress = compress
+        self._codec = None
+        self._compression_stats = CompressionStats()
+
+        # Client ID (identifies the owner of device lease)
+        # and lease state
+        self._client_id = '{0}:{1}'.format(socket.gethostname(), uuid.uuid4().hex[:8])
+        self._lease = False
+
+        # Internal vars to store refs to server:
+        #   _proxy - proxy of the current connection (watched by heartbeat),
+        #   _service - object used by client methods: _proxy or,
+        #   within batch(), the batch recorder
         self._connection = None
+        self._proxy = None
         self._service = None
+        self._batch_recorder = None
+
+        # In-process service (see local_client())
+        self._local_service = local_service
+
+        # Background thread serving server-push callbacks
+        # (started by the first subscribe() call)
+        self._bg_thread = None
+
+        # Serializes connect() calls from user and heartbeat threads
+        self._conn_lock = threading.RLock()
+
+        # In-process link can not be lost
+        self._heartbeat = heartbeat if local_service is None else None
 
         # Connect to server
         self.connect(host=host, port=port)
 
+        # Heartbeat thread and its separate connection
+        # to ping the server while calls are in flight
+        self._hb_stop = threading.Event()
+        self._hb_thread = None
+        self._ping_conn = None
+
+        if self._heartbeat is not None:
+            self._hb_thread = threading.Thread(
+                target=self._heartbeat_loop,
+                daemon=True
+            )
+            self._hb_thread.start()
+
     def connect(self, host='place_holder', port=-1):
+        with self._conn_lock:
+            return self._connect(host=host, port=port)
+
+    def close(self):
+        """Stop heartbeat and close connection"""
+
+        if self._hb_thread is not None:
+            self._hb_stop.set()
+
+            # Wait for the running heartbeat check or reconnection attempt
+            # (not under _conn_lock: the heartbeat thread takes it)
+            if self._hb_thread is not threading.current_thread():
+                self._hb_thread.join()
+
+            self._close_ping_conn()
+
+        with self._conn_lock:
+            try:
+                self._bg_thread.stop()
+            except:
+                pass
+            self._bg_thread = None
+
+            try:
+                self._connection.close()
+            except:
+                pass
+
+            self._connection = None
+            self._set_proxy(None)
+
+        return 0
+
+    def _connect(self, host, port):
 
         # Update server address if new values are given
         if host != 'place_holder':
@@ -24,30 +146,799 @@ class ClientBase:
             self._port = port
 
         # Clean-up old connection if it exists
-        if self._connection is not None or self._service is not None:
+        #   (dropping the old service proxy also invalidates
+        #   all remote methods cached in it)
+        if self._connection is not None or self._proxy is not None:
             try:
-                self._connection.close()
+                self._bg_thread.stop()
             except:
                 pass
+            self._bg_thread = None
+
+            # Connection of a lost link was already shut down
+            # (close() would wait for the dead server)
+            if self._proxy is None or not self._proxy.lost:
+                try:
+                    self._connection.close()
+                except:
+                    pass
 
             self._connection = None
-            self._service = None
+            self._set_proxy(None)
+
+        # In-process service: no connection, the proxy calls it directly
+        if self._local_service is not None:
+            self._set_proxy(_ServiceProxy(
+                root=self._local_service,
+                transport_opts=self._get_transport_opts(),
+                stats=self._compression_stats
+            ))
+            return 0
 
         # Connect to server
         try:
-            self._connection = rpyc.connect(
-                host=self._host,
-                port=self._port,
+            # Disable Nagle's algorithm: otherwise small requests, following
+            # each other, wait for delayed ACK (up to 40 ms per call).
+            # Disable channel compression: by default, rpyc zlib-compresses
+            # every frame above 3 kB, which caps throughput of large arrays.
+            # Compression is only applied by the negotiated codec
+            self._connection = rpyc.connect_channel(
+                Channel(
+                    SocketStream.connect(
+                        host=self._host,
+                        port=self._port,
+                        nodelay=True
+                    ),
+                    compress=False
+                ),
                 config={
                     'allow_public_attrs': True,
                     'sync_request_timeout': 300
                 }
             )
-            self._service = self._connection.root
+
+            # TCP connection to a hung server process can still be accepted:
+            # check that the server answers before the first sync request
+            if self._heartbeat is not None:
+                self._connection.ping(timeout=self._heartbeat)
+            self._codec = self._negotiate_codec()
+            self._set_proxy(_ServiceProxy(
+                root=self._connection.root,
+                transport_opts=self._get_transport_opts(),
+                codec=self._codec,
+                stats=self._compression_stats
+            ))
 
             return 0
 
         except Exception as exc_obj:
+            if self._connection is not None:
+                try:
+                    self._connection._channel.close()
+                except Exception:
+                    pass
+
             self._connection = None
-            self._service = None
+            self._set_proxy(None)
             raise exc_obj
+
+    def _set_proxy(self, proxy):
+        self._proxy = proxy
+
+        # Within batch(), _service is the recorder: it is replaced on exit
+        if self._batch_recorder is None:
+            self._service = proxy
+
+    # Heartbeat and background reconnect
+
+    def _heartbeat_loop(self):
+
+        delay = self._heartbeat
+
+        while not self._hb_stop.wait(delay):
+
+            with self._conn_lock:
+                proxy = self._proxy
+
+            if proxy is not None and not proxy.lost:
+                # Link was alive. If it is lost now, first let pending
+                # calls fail and try to reconnect after the next interval
+                self._check_link()
+                delay = self._heartbeat
+                continue
+
+            # Link is lost: try to reconnect, back off exponentially on failure
+            try:
+                with self._conn_lock:
+                    # close() could be called after the wait:
+                    # do not reopen the closed client
+                    if self._hb_stop.is_set():
+                        return
+
+                    self._connect(host='place_holder', port=-1)
+                delay = self._heartbeat
+            except Exception:
+                delay = min(2 * delay, max(self.reconnect_max_delay, self._heartbeat))
+
+    def _check_link(self):
+        """Ping the server
+
+        :return: (bool) True if the link is alive
+        """
+
+        with self._conn_lock:
+            connection = self._connection
+            proxy = self._proxy
+
+        if connection is None or proxy is None or proxy.lost:
+            return False
+
+        if not proxy.in_flight:
+            self._close_ping_conn()
+
+            try:
+                connection.ping(timeout=self._heartbeat)
+                return True
+
+            except Exception:
+                # A call, started while the ping was pending, delays the reply:
+                # no answer does not mean that the server is lost
+                if not proxy.in_flight or connection.closed:
+                    self._drop_link(service=proxy, connection=connection)
+                    return False
+
+        # Ping would be queued behind the running call and time out:
+        # ping over a separate connection instead
+        if self._ping_separately():
+            return True
+
+        self._drop_link(service=proxy, connection=connection)
+        return False
+
+    def _ping_separately(self):
+        """Ping the server over the separate heartbeat connection
+
+        :return: (bool) True if the server answered
+        """
+
+        # Open connection could be closed by the server idle timeout
+        # meanwhile: then retry once over a new one
+        if self._ping_conn is not None:
+            try:
+                self._ping_conn.ping(timeout=self._heartbeat)
+                return True
+            except Exception:
+                self._close_ping_conn()
+
+        try:
+            self._ping_conn = rpyc.connect_channel(
+                Channel(
+                    SocketStream.connect(
+                        host=self._host,
+                        port=self._port,
+                        nodelay=True,
+                        timeout=self._heartbeat
+                    ),
+                    compress=False
+                )
+            )
+            self._ping_conn.ping(timeout=self._heartbeat)
+            return True
+
+        except Exception:
+            self._close_ping_conn()
+            return False
+
+    def _close_ping_conn(self):
+
+        if self._ping_conn is None:
+            return
+
+        # Shut the socket down only: do not wait for a (possibly hung) server
+        try:
+            self._ping_conn._channel.close()
+        except Exception:
+            pass
+
+        self._ping_conn = None
+
+    @staticmethod
+    def _drop_link(service, connection):
+        """Mark the link as lost: pending and new calls fail fast"""
+
+        service.lost = True
+
+        # Do not use connection.close(): it sends a request
+        # to the (possibly hung) server and waits for reply.
+        # Shutting the socket down wakes up all threads waiting for replies.
+        try:
+            connection._channel.close()
+        except Exception:
+            pass
+
+    def _negotiate_codec(self):
+
+        if self._compress is None:
+            use_compression = not _is_local_host(self._host)
+        else:
+            use_compression = bool(self._compress)
+
+        if not use_compression:
+            return None
+
+        try:
+            server_codecs = tuple(self._connection.root.exposed_get_codecs())
+        except AttributeError:
+            # Server does not support compression
+            return None
+
+        return choose_codec(
+            client_codecs=available_codecs(),
+            server_codecs=server_codecs
+        )
+
+    def _get_transport_opts(self):
+
+        if self._local_service is not None:
+            transport_opts = (('local', True),)
+
+            if self._lease:
+                transport_opts += (('owner', self._client_id),)
+
+            return transport_opts
+
+        if self._shm is None:
+            use_shm = _is_local_host(self._host)
+        else:
+            use_shm = bool(self._shm)
+
+        transport_opts = ()
+
+        if use_shm and shm_available():
+            transport_opts += (('shm', True),)
+
+        if self._codec is not None:
+            transport_opts += (('codec', self._codec),)
+
+        # Calls of the lease owner pass through the lease
+        if self._lease:
+            transport_opts += (('owner', self._client_id),)
+
+        return transport_opts
+
+    def get_compression_stats(self):
+        """Compression counters (see CompressionStats.as_dict())
+
+        :return: (dict) {'codec': negotiated codec name or None,
+                         'client': client-side counters,
+                         'server': server-side counters}
+        """
+
+        return dict(
+            codec=self._codec,
+            client=self._compression_stats.as_dict(),
+            server=pickle.loads(self._service.exposed_get_compression_stats())
+        )
+
+    def get_metrics(self):
+        """Per-method call metrics of the service
+        (see pylabnet.core.metrics.CallMetrics.snapshot())
+
+        :return: (dict) metrics or None, if disabled on the server
+        """
+
+        res_pickle = self._service.exposed_get_metrics()
+
+        if res_pickle is None:
+            return None
+
+        return pickle.loads(res_pickle)
+
+    # Device lease
+
+    def acquire_lease(self, duration=60, timeout=None):
+        """Reserve the device for exclusive use by this client.
+
+        While the lease is active, calls of all other clients wait
+        until release_lease() is called or the lease expires.
+
+        :param duration: (float) lease duration [s]
+        :param timeout: (float) max waiting time [s] for the lease of another
+                        client to end. None - wait infinitely.
+                        DeviceBusyError is raised if timeout elapses.
+        :return: 0
+        """
+
+        ret_code = self._service.exposed_acquire_lease(
+            owner=self._client_id,
+            duration=duration,
+            timeout=timeout
+        )
+
+        self._lease = True
+        self._proxy.transport_opts = self._get_transport_opts()
+
+        return ret_code
+
+    def release_lease(self):
+
+        self._lease = False
+        self._proxy.transport_opts = self._get_transport_opts()
+
+        return self._service.exposed_release_lease(owner=self._client_id)
+
+    @contextlib.contextmanager
+    def lease(self, duration=60, timeout=None):
+        """Context manager version of acquire_lease()/release_lease()
+
+            with mw_src.lease():
+                mw_src.set_pwr(pwr)
+                mw_src.set_freq(freq)
+                mw_src.on()
+        """
+
+        self.acquire_lease(duration=duration, timeout=timeout)
+        try:
+            yield
+        finally:
+            self.release_lease()
+
+    # Batched calls
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Record calls and send them to the server in one round trip.
+
+            with mw_src.batch():
+                mw_src.set_pwr(pwr)
+                mw_src.set_freq(freq)
+                on_future = mw_src.on()
+
+        Inside the context, every call of self._service.exposed_xxx() is only
+        recorded and returns concurrent.futures.Future, which is resolved when
+        the context exits. So client methods, which return the result of
+        self._service.exposed_xxx() as is, return futures. Client methods,
+        which post-process the result (e.g. unpickle it), can not be batched.
+
+        On context exit, the server executes all calls in order under exclusive
+        device access and stops at the first exception: BatchError is raised
+        (futures of the failed call and of all following ones raise it too).
+        If an exception is raised inside the context, nothing is sent.
+
+        Notice: the client object should not be used by other threads
+        while the context is active.
+        """
+
+        recorder = _BatchRecorder()
+
+        with self._conn_lock:
+            self._batch_recorder = recorder
+            self._service = recorder
+
+        try:
+            yield recorder
+        except BaseException:
+            recorder.cancel()
+            raise
+        finally:
+            # Heartbeat could reconnect meanwhile: restore the current proxy
+            with self._conn_lock:
+                self._batch_recorder = None
+                self._service = self._proxy
+                service = self._proxy
+
+        if service is None:
+            recorder.cancel()
+            raise ConnectionLostError('Connection to the server is lost. Reconnecting')
+
+        recorder.send(service=service)
+
+    # Server-push subscriptions
+
+    def subscribe(self, topic, callback, max_queue=16):
+        """Register callback for data published by the service for the topic.
+
+        Instead of polling, the service pushes new data as soon as it is
+        available. callback(data) is called from a background thread.
+
+        :param topic: (str) topic name
+        :param callback: (callable) callback(data)
+        :param max_queue: (int) max number of items waiting for delivery
+                          on the server side. If callback falls behind,
+                          the oldest items are dropped.
+        :return: (int) subscription ID
+        """
+
+        # Serve requests coming from the server (callback calls).
+        # In-process service calls the callback directly
+        if self._bg_thread is None and self._connection is not None:
+            self._bg_thread = rpyc.BgServingThread(self._connection)
+
+        def deliver(data):
+            callback(decode_result(data))
+
+        return self._service.exposed_subscribe(
+            topic=topic,
+            callback=deliver,
+            max_queue=max_queue
+        )
+
+    def unsubscribe(self, sub_id):
+        """Cancel subscription
+
+        :param sub_id: (int) subscription ID returned by subscribe()
+        :return: (int) number of items dropped during subscription lifetime
+        """
+
+        return self._service.exposed_unsubscribe(sub_id=sub_id)
+
+    # Asynchronous calls
+
+    def call_async(self, method_name, *args, **kwargs):
+        """Call client method in a background thread.
+
+        Allows to overlap calls to different servers (and local work)
+        instead of paying each round trip in series:
+
+            ctr_future = ctr.call_async('get_count_ar', timeout=10)
+            ...
+            count_ar = ctr_future.result(timeout=20)
+
+        :param method_name: (str) name of the client method, e.g. 'get_count_ar'
+        :param args, kwargs: arguments of the method call
+
+        :return: (concurrent.futures.Future) future for the call result.
+                Use future.result(timeout) for per-call timeout
+                and future.cancel() to drop the call if it has not started yet.
+                Notice: a call which is already in progress cannot be aborted
+                on the server - only the caller is released.
+        """
+
+        method = getattr(self, method_name)
+
+        future = Future()
+
+        # Daemon thread per call: a hung call can never block
+        # other calls or interpreter exit
+        call_thread = threading.Thread(
+            target=_run_call,
+            args=(future, method, args, kwargs),
+            daemon=True
+        )
+        call_thread.start()
+
+        return future
+
+    def __getattr__(self, name):
+        # Awaitable versions of all client methods:
+        #   count_ar = await ctr.get_count_ar_async(timeout=10, call_timeout=20)
+        #   (call_timeout [s] - per-call timeout, None - wait infinitely)
+        if name.endswith('_async'):
+            method_name = name[:-len('_async')]
+
+            if callable(getattr(type(self), method_name, None)):
+                return functools.partial(self._await_call, method_name)
+
+        raise AttributeError(
+            '{0} object has no attribute {1}'.format(type(self).__name__, name)
+        )
+
+    async def _await_call(self, method_name, *args, call_timeout=None, **kwargs):
+        future = asyncio.wrap_future(
+            self.call_async(method_name, *args, **kwargs)
+        )
+
+        # On timeout or cancellation of the awaiting task,
+        # the wrapped future is cancelled and the caller is released
+        return await asyncio.wait_for(future, timeout=call_timeout)
+
+
+def local_client(client_class, service, **kwargs):
+    """Instantiate client bound directly to a service instance in this process.
+
+    Client API is exactly the same as for the remote service, but no socket
+    and no serialization is involved: exposed methods are called directly
+    (still through the device lock, coalescing and metrics of the service)
+    and exceptions are raised with their original types.
+    Scripts can use local hardware at in-process speed without code changes:
+
+        service = ni654x.Service()
+        service.assign_module(module=p_gen)
+        p_gen_client = local_client(ni654x.Client, service)
+
+    Notice: return values are not copied - a client gets the objects returned
+    by the service (e.g. an array which the driver keeps internally).
+
+    :param client_class: subclass of ClientBase
+    :param service: (ServiceBase) service instance (with module assigned)
+    :param kwargs: other arguments of client_class constructor
+    :return: client instance
+    """
+
+    return client_class(host='localhost', port=0, local_service=service, **kwargs)
+
+
+def _run_call(future, method, args, kwargs):
+    # Call was cancelled before it started
+    if not future.set_running_or_notify_cancel():
+        return
+
+    try:
+        res = method(*args, **kwargs)
+    except BaseException as exc_obj:
+        future.set_exception(exc_obj)
+    else:
+        future.set_result(res)
+
+
+class ConnectionLostError(ConnectionError):
+    """Link to the server is lost (detected by heartbeat).
+    The client reconnects in background, the call can be repeated later.
+    """
+
+    pass
+
+
+class BatchError(Exception):
+    """Exception raised by a call within ClientBase.batch() on the server side"""
+
+    def __init__(self, index, method_name, exc_type, exc_msg, traceback_str):
+        """
+
+        :param index: (int) index of the failed call in the batch
+        :param method_name: (str) name of the failed exposed method
+        :param exc_type: (str) name of the exception type
+        :param exc_msg: (str) exception message
+        :param traceback_str: (str) server-side traceback
+        """
+
+        super().__init__(
+            'Call #{0} ({1}) of the batch raised {2}: {3}\n\n'
+            '========= Remote traceback =========\n{4}'
+            ''.format(index, method_name, exc_type, exc_msg, traceback_str)
+        )
+
+        self.index = index
+        self.method_name = method_name
+        self.exc_type = exc_type
+        self.exc_msg = exc_msg
+        self.traceback_str = traceback_str
+
+
+class _BatchRecorder:
+    """Stand-in for _ServiceProxy within ClientBase.batch(): exposed method
+    calls are recorded and are sent by send() in one request.
+    """
+
+    def __init__(self):
+        # [(method_name, args, kwargs_items)]
+        self._calls = []
+        # [(Future, out)]
+        self._futures = []
+
+    def __getattr__(self, name):
+        if not name.startswith('exposed_'):
+            raise AttributeError(
+                'Only exposed methods can be called within batch(): {}'.format(name)
+            )
+
+        return _BatchMethod(recorder=self, name=name[len('exposed_'):])
+
+    def record(self, name, out, args, kwargs):
+        future = Future()
+
+        self._calls.append((name, tuple(args), tuple(kwargs.items())))
+        self._futures.append((future, out))
+
+        return future
+
+    def cancel(self):
+        for future, _ in self._futures:
+            future.cancel()
+
+    def send(self, service):
+        """Send recorded calls and resolve their futures
+
+        :param service: (_ServiceProxy) proxy of the remote service
+        """
+
+        if not self._calls:
+            return
+
+        for future, _ in self._futures:
+            future.set_running_or_notify_cancel()
+
+        try:
+            res_list, error = service.exposed_batch(calls=tuple(self._calls))
+        except BaseException as exc_obj:
+            for future, _ in self._futures:
+                future.set_exception(exc_obj)
+            raise
+
+        # Make local copies (results are normally received by value already,
+        # but a non-brineable item turns the whole tuple into a netref)
+        res_list = tuple(res_list)
+
+        for (future, out), res in zip(self._futures, res_list):
+            future.set_result(
+                decode_result(
+                    res,
+                    out=out,
+                    release_shm=service._release_shm,
+                    stats=service.stats
+                )
+            )
+
+        if error is None:
+            return
+
+        index, exc_type, exc_msg, traceback_str = tuple(error)
+
+        batch_error = BatchError(
+            index=index,
+            method_name=self._calls[index][0],
+            exc_type=exc_type,
+            exc_msg=exc_msg,
+            traceback_str=traceback_str
+        )
+
+        self._futures[index][0].set_exception(batch_error)
+
+        # Calls after the failed one were not executed
+        for future, _ in self._futures[index + 1:]:
+            future.set_exception(batch_error)
+
+        raise batch_error
+
+
+class _BatchMethod:
+
+    def __init__(self, recorder, name):
+        self._recorder = recorder
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return self.into(None, *args, **kwargs)
+
+    def into(self, out, *args, **kwargs):
+        return self._recorder.record(self._name, out, args, kwargs)
+
+
+class _ServiceProxy:
+    """Client-side wrapper for the root object of the remote service.
+
+    Subclasses of ClientBase call self._service.exposed_xxx() exactly as they
+    would on the RPyC root object. The differences are:
+
+    - array envelopes (see pylabnet.core.transport) in return values
+      are automatically unpacked into numpy arrays;
+
+    - exposed methods are resolved only once: the first lookup stores
+      the method wrapper in the instance __dict__, such that all subsequent
+      self._service.exposed_xxx lookups are plain local attribute reads.
+
+    One proxy instance is bound to one connection: ClientBase.connect()
+    creates a new proxy, which invalidates all cached methods.
+    """
+
+    def __init__(self, root, transport_opts=(), codec=None, stats=None):
+        """
+
+        :param root: RPyC root object of the service (connection.root)
+        :param transport_opts: (tuple) transport options to send with each call
+                               (can be updated later, cached methods
+                               always use the current value)
+        :param codec: (str) negotiated codec to compress large bytes arguments.
+                      None - no compression
+        :param stats: (CompressionStats) [optional] compression counters
+        """
+
+        self._root = root
+        self.transport_opts = transport_opts
+        self.codec = codec
+        self.stats = stats
+
+        # Set by ClientBase heartbeat, when the server stops answering
+        self.lost = False
+
+        # Number of calls waiting for reply (heartbeat does not ping meanwhile)
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only called if name is not in the instance __dict__ yet
+        attr = getattr(self._root, name)
+
+        if name.startswith('exposed_'):
+            method = _RemoteMethod(method=attr, proxy=self)
+            # Cache method wrapper
+            self.__dict__[name] = method
+            return method
+        else:
+            return attr
+
+    def call_started(self):
+        with self._in_flight_lock:
+            self.in_flight += 1
+
+    def call_finished(self):
+        with self._in_flight_lock:
+            self.in_flight -= 1
+
+    def _release_shm(self, name):
+        # Report read-out of shared memory segment without waiting for reply
+        rpyc.async_(self._root.exposed_release_shm)(name)
+
+
+class _RemoteMethod:
+    """Callable wrapper for an exposed method of the remote service.
+
+    Usage:
+        res = self._service.exposed_xxx(*args, **kwargs)
+        res = self._service.exposed_xxx.into(out_ar, *args, **kwargs)
+
+    The second form copies received array into preallocated buffer out_ar.
+    """
+
+    def __init__(self, method, proxy):
+        self._method = method
+        self._proxy = proxy
+
+    def __call__(self, *args, **kwargs):
+        return self.into(None, *args, **kwargs)
+
+    def into(self, out, *args, **kwargs):
+        proxy = self._proxy
+
+        if proxy.lost:
+            raise ConnectionLostError('Connection to the server is lost. Reconnecting')
+
+        transport_opts = proxy.transport_opts
+
+        if proxy.codec is not None:
+            args, kwargs, compressed = compress_args(
+                args, kwargs,
+                codec=proxy.codec,
+                stats=proxy.stats
+            )
+            if compressed:
+                transport_opts += (('zargs', True),)
+
+        if transport_opts:
+            kwargs[TRANSPORT_KW] = transport_opts
+
+        proxy.call_started()
+        try:
+            res = self._method(*args, **kwargs)
+        except EOFError:
+            if proxy.lost:
+                raise ConnectionLostError('Connection to the server is lost. Reconnecting')
+            raise
+        finally:
+            proxy.call_finished()
+
+        return decode_result(
+            res,
+            out=out,
+            release_shm=proxy._release_shm,
+            stats=proxy.stats
+        )
+
+
+def _is_local_host(host):
+    """Check if host refers to this machine
+
+    :param host: (str) host name or IP address
+    :return: (bool)
+    """
+
+    if host in ('localhost', '::1') or host.startswith('127.'):
+        return True
+
+    try:
+        host_ip = socket.gethostbyname(host)
+        local_ips = socket.gethostbyname_ex(socket.gethostname())[2]
+    except (socket.error, UnicodeError):
+        return False
+
+    return host_ip.startswith('127.') or host_ip in local_ips
@@ -0,0 +1,117 @@
+""" Coalescing of identical concurrent read-only calls for ServiceBase.
+
+When several clients (GUI, pause script, measurement logic) ask the same
+service for get_status() at the same moment, only the first call goes to
+the hardware. All identical calls (same method and arguments), arriving
+while it is in flight, wait for it and receive the same result
+(or the same exception).
+
+Optionally, the result is kept for a short time-to-live (TTL) and is
+returned to identical calls arriving within the TTL.
+
+Any other call to the service (e.g. set_pwr()) invalidates all kept
+results: a call which was in flight during invalidation does not
+store its (possibly stale) result.
+
+Calls of different device lock owners (see pylabnet.core.mutex leases)
+are never coalesced: the lease holder must not wait for a call which
+its own lease blocks, and other clients must not get results through
+somebody else's lease.
+"""
+
+import time
+import threading
+from concurrent.futures import Future
+
+
+class CallCoalescer:
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+
+        # {call_key: Future} - calls currently in flight
+        self._in_flight = dict()
+
+        # {call_key: (result, completion_time)} - kept results
+        self._results = dict()
+
+        # Incremented by every invalidation
+        self._generation = 0
+
+    def call(self, key, func, ttl=0):
+        """Execute func() or join identical call in flight.
+
+        :param key: (hashable) call key: identical calls have equal keys
+        :param func: (callable) func() executes the call
+        :param ttl: (float) [s] time-to-live of the result. 0 - do not keep
+        :return: result of func()
+        """
+
+        with self._lock:
+
+            if ttl > 0 and key in self._results:
+                res, t_done = self._results[key]
+
+                if time.time() - t_done < ttl:
+                    return res
+                else:
+                    del self._results[key]
+
+            future = self._in_flight.get(key)
+
+            if future is not None:
+                is_leader = False
+            else:
+                is_leader = True
+                future = Future()
+                self._in_flight[key] = future
+                generation = self._generation
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            res = func()
+
+        except BaseException as exc_obj:
+            with self._lock:
+                del self._in_flight[key]
+
+            future.set_exception(exc_obj)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+
+            if ttl > 0 and generation == self._generation:
+                self._results[key] = (res, time.time())
+
+        future.set_result(res)
+
+        return res
+
+    def invalidate(self):
+        """Drop all kept results (device state might have changed)"""
+
+        with self._lock:
+            self._generation += 1
+            self._results.clear()
+
+
+def make_call_key(name, args, kwargs, owner=None):
+    """Build hashable key of the call
+
+    :param owner: (str) [optional] lock owner of the caller (lease holder ID)
+    :return: (tuple) key or None, if some argument is not hashable
+             (such calls are never coalesced)
+    """
+
+    key = (name, owner, args, tuple(sorted(kwargs.items())))
+
+    try:
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
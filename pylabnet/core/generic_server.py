@@ -1,18 +1,80 @@
 import rpyc
+import time
+import socket
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from rpyc.core.stream import SocketStream
+from rpyc.core.channel import Channel
 
 
 class GenericServer:
-    def __init__(self, service, port, host='localhost'):
+    def __init__(self, service, port, host='localhost',
+                 max_workers=None, max_connections=None, idle_timeout=None,
+                 registry=None, name=None, capabilities=()):
+        """
 
-        self._server = rpyc.ThreadedServer(
+        :param service: service instance
+        :param port: (int) server port
+        :param host: (str) server host
+        :param max_workers: (int) [optional] serve connections by a bounded
+                            pool of worker threads: connections beyond
+                            max_workers wait for a free worker (their calls
+                            block meanwhile). A worker is only freed when its
+                            connection is closed, so idle_timeout is required.
+                            None - one new thread per connection
+        :param max_connections: (int) [optional] max number of open connections,
+                                new connections beyond it are rejected.
+                                None - no limit
+        :param idle_timeout: (float) [optional] close connections, which had
+                             no traffic for idle_timeout [s]. Bounds the wait of
+                             queued connections for a worker (see max_workers).
+                             None - never close idle connections
+        :param registry: (tuple) [optional] (host, port) of the registry server
+                         (see pylabnet.core.registry) to register the service at.
+                         Requires host reachable from other machines
+                         (e.g. '0.0.0.0'), not loopback
+        :param name: (str) service name to register under
+        :param capabilities: (tuple of str) [optional] capabilities to register
+        """
+
+        # Registration in the service registry
+        self._registry = registry
+        self._reg_name = name
+        self._reg_host = host
+        self._reg_port = port
+        self._reg_capabilities = tuple(capabilities)
+        self._reg_stop = threading.Event()
+
+        if registry is not None and name is None:
+            raise ValueError('GenericServer(): name is required to register the service')
+
+        # Otherwise idle clients keep the workers forever, and calls
+        # of queued connections hang without error
+        if max_workers is not None and idle_timeout is None:
+            raise ValueError('GenericServer(): idle_timeout is required with max_workers')
+
+        if registry is not None:
+            # Import here: registry module itself depends on ServiceBase/ClientBase
+            from pylabnet.core.registry import is_loopback
+
+            if is_loopback(host):
+                raise ValueError(
+                    'GenericServer(): server bound to "{}" cannot be registered: '
+                    'remote clients would connect to their own machine. '
+                    'Use host="0.0.0.0" or the machine address'.format(host)
+                )
+
+        self._server = _ThreadedServer(
             service=service,
             hostname=host,
             port=port,
             protocol_config={
                 'allow_public_attrs': True,
                 'sync_request_timeout': 300
-            }
+            },
+            max_workers=max_workers,
+            max_connections=max_connections,
+            idle_timeout=idle_timeout
         )
 
         self._server_thread = threading.Thread(
@@ -23,11 +85,256 @@ class GenericServer:
     def start(self):
         self._server_thread.start()
 
-    def stop(self):
-        pass
+        # Register in background: server start is never delayed
+        if self._registry is not None:
+            threading.Thread(target=self._keep_registered, daemon=True).start()
+
+    def stop(self, timeout=10):
+        """Graceful shutdown: stop accepting new connections, let in-flight
+        calls finish, then close all connections.
+
+        :param timeout: (float) [s] max time to wait for in-flight calls.
+                        Connections still busy after timeout are closed anyway.
+        :return: 0
+        """
+
+        if self._registry is not None:
+            self._reg_stop.set()
+            self._unregister()
+
+        self._server.drain(timeout=timeout)
+
+        if self._server_thread.is_alive():
+            self._server_thread.join()
+        else:
+            # Server was never started: release the port
+            self._server.close()
+
+        return 0
 
     @staticmethod
     def _start_server(server_obj):
         server_obj.start()
 
+    def _keep_registered(self):
+        # Import here: registry module itself depends on ServiceBase/ClientBase
+        from pylabnet.core.registry import RegistryClient, registered_host, REGISTRATION_TTL
+
+        # Refresh registration well before it expires
+        period = REGISTRATION_TTL / 3
+        registry_client = None
+
+        while not self._reg_stop.is_set():
+            try:
+                if registry_client is None:
+                    registry_client = RegistryClient(
+                        host=self._registry[0],
+                        port=self._registry[1]
+                    )
+
+                registry_client.register(
+                    name=self._reg_name,
+                    host=registered_host(self._reg_host, registry_host=self._registry[0]),
+                    port=self._reg_port,
+                    capabilities=self._reg_capabilities,
+                    ttl=REGISTRATION_TTL
+                )
+
+            except Exception:
+                self._server.logger.warning(
+                    'Registration of "{}" at the registry {} failed'
+                    ''.format(self._reg_name, self._registry)
+                )
+                registry_client = None
+
+            self._reg_stop.wait(period)
+
+    def _unregister(self):
+        from pylabnet.core.registry import RegistryClient, registered_host
+
+        try:
+            registry_client = RegistryClient(
+                host=self._registry[0],
+                port=self._registry[1]
+            )
+            registry_client.unregister(
+                name=self._reg_name,
+                host=registered_host(self._reg_host, registry_host=self._registry[0]),
+                port=self._reg_port
+            )
+            registry_client.close()
+
+        except Exception:
+            pass
+
+
+class _ThreadedServer(rpyc.ThreadedServer):
+    """rpyc.ThreadedServer with:
+
+    - Nagle's algorithm disabled on client sockets. Otherwise small replies
+      and requests, following each other, wait for delayed ACK
+      (up to 40 ms per call);
+
+    - rpyc channel compression disabled: large payloads are only compressed
+      by the codec negotiated with the client (see pylabnet.core.transport);
+
+    - optional bounded worker pool, connection limit and idle timeout;
+
+    - draining shutdown (see drain()).
+    """
+
+    # Period [s] of idle-timeout and shutdown checks in connection loops
+    _check_period = 0.5
+
+    def __init__(self, *args, max_workers=None, max_connections=None, idle_timeout=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+
+        if max_workers is not None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='pylabnet-server'
+            )
+        else:
+            self._pool = None
 
+        # Number of running connection loops
+        self._handler_n = 0
+        self._handler_cond = threading.Condition()
+
+        self._draining = threading.Event()
+        self._drain_timeout = 0
+
+    def _listen(self):
+        super()._listen()
+
+        # stop() was called before the accept loop started:
+        # _listen() has just set active back to True
+        if self._draining.is_set():
+            self.active = False
+
+    def _accept_method(self, sock):
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, AttributeError):
+            # not a TCP socket
+            pass
+
+        # accept() has already added the new socket to self.clients
+        if self._max_connections is not None and len(self.clients) > self._max_connections:
+            self.logger.warning(
+                'Connection limit ({}) is reached. New connection is rejected'
+                ''.format(self._max_connections)
+            )
+            self.clients.discard(sock)
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+            return
+
+        if self._pool is not None:
+            self._pool.submit(self._authenticate_and_serve_client, sock)
+        else:
+            super()._accept_method(sock)
+
+    def _serve_client(self, sock, credentials):
+        addrinfo = sock.getpeername()
+        self.logger.info('welcome {}'.format(addrinfo))
+
+        try:
+            config = dict(
+                self.protocol_config,
+                credentials=credentials,
+                endpoints=(sock.getsockname(), addrinfo),
+                logger=self.logger
+            )
+            conn = self.service._connect(Channel(SocketStream(sock), compress=False), config)
+            self._handle_connection(conn)
+        finally:
+            self.logger.info('goodbye {}'.format(addrinfo))
+
+    def _handle_connection(self, conn):
+
+        with self._handler_cond:
+            self._handler_n += 1
+
+        try:
+            last_activity = time.time()
+
+            # Unlike conn.serve_all(), return periodically
+            # to check idle timeout and shutdown flag
+            while not conn.closed and not self._draining.is_set():
+                try:
+                    active = conn.serve(self._check_period)
+                except EOFError:
+                    break
+
+                if active:
+                    last_activity = time.time()
+
+                elif (
+                    self._idle_timeout is not None
+                    and time.time() - last_activity > self._idle_timeout
+                ):
+                    self.logger.info('Idle connection is closed')
+                    break
+
+        finally:
+            _close_conn(conn)
+
+            with self._handler_cond:
+                self._handler_n -= 1
+                self._handler_cond.notify_all()
+
+    def drain(self, timeout):
+        """Stop accepting connections and let connection loops finish
+        their current calls. Remaining connections are closed
+        by close() after timeout.
+
+        :param timeout: (float) max waiting time [s]
+        """
+
+        self._drain_timeout = timeout
+        self._draining.set()
+
+        # Accept loop in start() exits within listener timeout
+        # and calls close()
+        self.active = False
+
+    def close(self):
+        if self._draining.is_set():
+            # Do not accept new connections while waiting
+            try:
+                self.listener.close()
+            except OSError:
+                pass
+
+            with self._handler_cond:
+                self._handler_cond.wait_for(
+                    lambda: self._handler_n == 0,
+                    timeout=self._drain_timeout
+                )
+
+        super().close()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+def _close_conn(conn):
+
+    # Shut the socket down first: conn.close() sends a close request
+    # and would wait for the reply of a client which is not serving
+    try:
+        conn._channel.close()
+    except Exception:
+        pass
+
+    try:
+        conn.close()
+    except Exception:
+        pass
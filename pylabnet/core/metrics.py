@@ -0,0 +1,222 @@
+""" Per-call metrics of ServiceBase.
+
+For each exposed method, ServiceBase records:
+
+    wait      - time waiting for the device lock [s] (queue wait)
+    exec      - execution time of the method [s]
+    serialize - time spent on preparing arguments and result for sending
+                (decompression, array envelopes, shared memory, compression) [s]
+    bytes_in  - approximate payload size of the call arguments [bytes]
+    bytes_out - approximate payload size of the prepared result [bytes]
+
+Timings are kept in rolling histograms: only the calls of the last `window`
+seconds are counted. Histogram bins are logarithmic (4 bins per decade,
+from 1 us to 100 s), percentiles are estimated as upper bin edges.
+"""
+
+import time
+import bisect
+import threading
+import collections
+import numpy as np
+
+
+# Logarithmic bin edges [s]: 1 us ... 100 s, 4 bins per decade
+TIME_BIN_EDGES = tuple(10 ** (k / 4) for k in range(-24, 9))
+
+TIMING_KEYS = ('wait', 'exec', 'serialize')
+
+
+class RollingHistogram:
+
+    def __init__(self, edges=TIME_BIN_EDGES, window=60, slot_n=6):
+        """
+
+        :param edges: (tuple) increasing bin edges
+        :param window: (float) [s] rolling window length
+        :param slot_n: (int) number of time slots the window is divided into:
+                       data is dropped slot by slot
+        """
+
+        self._edges = edges
+        self._slot_len = window / slot_n
+        self._slot_n = slot_n
+
+        # deque of [slot_index, counts, count, total, max_value]
+        self._slots = collections.deque()
+
+    def add(self, value):
+
+        slot_idx = int(time.time() / self._slot_len)
+
+        if not self._slots or self._slots[-1][0] != slot_idx:
+            self._slots.append([slot_idx, [0] * (len(self._edges) + 1), 0, 0.0, 0.0])
+            self._drop_old(slot_idx)
+
+        slot = self._slots[-1]
+        slot[1][bisect.bisect_left(self._edges, value)] += 1
+        slot[2] += 1
+        slot[3] += value
+        slot[4] = max(slot[4], value)
+
+    def snapshot(self):
+        """
+        :return: (dict) statistics of the rolling window:
+                 count, mean, max, p50, p90, p99, and
+                 counts - list of counts per bin
+                 (bin i covers values from edges[i-1] to edges[i])
+        """
+
+        self._drop_old(int(time.time() / self._slot_len))
+
+        counts = [0] * (len(self._edges) + 1)
+        count = 0
+        total = 0.0
+        max_value = 0.0
+
+        for _, slot_counts, slot_count, slot_total, slot_max in self._slots:
+            for idx, bin_count in enumerate(slot_counts):
+                counts[idx] += bin_count
+            count += slot_count
+            total += slot_total
+            max_value = max(max_value, slot_max)
+
+        return dict(
+            count=count,
+            mean=total / count if count else None,
+            max=max_value if count else None,
+            p50=self._percentile(counts, count, 0.5),
+            p90=self._percentile(counts, count, 0.9),
+            p99=self._percentile(counts, count, 0.99),
+            counts=counts
+        )
+
+    def _drop_old(self, slot_idx):
+        while self._slots and self._slots[0][0] <= slot_idx - self._slot_n:
+            self._slots.popleft()
+
+    def _percentile(self, counts, count, fraction):
+        if count == 0:
+            return None
+
+        threshold = fraction * count
+        cumulative = 0
+
+        for idx, bin_count in enumerate(counts):
+            cumulative += bin_count
+            if cumulative >= threshold:
+                # Upper edge of the bin (values above the last edge
+                # are reported as the last edge)
+                return self._edges[min(idx, len(self._edges) - 1)]
+
+
+class CallMetrics:
+    """Thread-safe per-method metrics storage"""
+
+    def __init__(self, window=60):
+        """
+
+        :param window: (float) [s] rolling window length of histograms
+        """
+
+        self._window = window
+        self._lock = threading.Lock()
+
+        # {method_name: dict}
+        self._methods = dict()
+
+    def record(self, name, wait, exec_time, serialize, bytes_in, bytes_out, error=False):
+
+        with self._lock:
+            entry = self._methods.get(name)
+
+            if entry is None:
+                entry = dict(
+                    calls=0,
+                    errors=0,
+                    bytes_in=0,
+                    bytes_out=0,
+                    hists={key: RollingHistogram(window=self._window) for key in TIMING_KEYS}
+                )
+                self._methods[name] = entry
+
+            entry['calls'] += 1
+            entry['errors'] += int(error)
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+
+            entry['hists']['wait'].add(wait)
+            entry['hists']['exec'].add(exec_time)
+            entry['hists']['serialize'].add(serialize)
+
+    def snapshot(self):
+        """
+        :return: (dict) {
+                    'time': snapshot time,
+                    'window': rolling window length [s],
+                    'time_bin_edges': histogram bin edges [s],
+                    'methods': {method_name: {
+                        'calls': total number of calls,
+                        'errors': total number of calls which raised an exception,
+                        'bytes_in', 'bytes_out': total payload sizes [bytes],
+                        'wait', 'exec', 'serialize': rolling histogram statistics
+                            (see RollingHistogram.snapshot())
+                    }}
+                 }
+        """
+
+        with self._lock:
+            snapshot = dict()
+
+            for name, entry in self._methods.items():
+                method_dict = dict(
+                    calls=entry['calls'],
+                    errors=entry['errors'],
+                    bytes_in=entry['bytes_in'],
+                    bytes_out=entry['bytes_out']
+                )
+                for key in TIMING_KEYS:
+                    method_dict[key] = entry['hists'][key].snapshot()
+
+                snapshot[name] = method_dict
+
+        return dict(
+            time=time.time(),
+            window=self._window,
+            time_bin_edges=list(TIME_BIN_EDGES),
+            methods=snapshot
+        )
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+
+
+def payload_size(obj):
+    """Approximate size of the payload to send [bytes].
+
+    Counts bytes/str objects (array envelopes consist of them) and numbers,
+    recursing into tuples, lists and dict values. Other objects are sent as
+    netrefs and count as 0.
+    """
+
+    obj_type = type(obj)
+
+    if obj_type in (bytes, bytearray, str):
+        return len(obj)
+
+    elif obj_type in (int, float, bool):
+        return 8
+
+    elif obj_type in (tuple, list):
+        return sum(payload_size(item) for item in obj)
+
+    elif obj_type is dict:
+        return sum(payload_size(item) for item in obj.values())
+
+    # type() check does not touch netrefs (no round trips)
+    elif issubclass(obj_type, (np.ndarray, np.generic)):
+        return int(obj.nbytes)
+
+    else:
+        return 0
@@ -1 +1,252 @@
-# TODO: implement mutex
+""" Device-level access control for services.
+
+GenericServer serves every client connection in its own thread, so without
+a lock, calls of different clients (e.g. GUI polling get_status and
+measurement logic) interleave on the same driver.
+
+DeviceLock serializes access to one device:
+
+- exclusive access (default for all calls): only one call at a time;
+
+- shared access (cheap getters which only read device state):
+  any number of shared calls can run simultaneously,
+  but never together with an exclusive call;
+
+- priority lanes: low-priority calls (status polls) wait as long as any
+  normal-priority call (measurement traffic) is waiting. New shared calls
+  also wait while an exclusive call is waiting, such that a stream of
+  getters can not starve the measurement;
+
+- exclusive leases: a client can reserve the device for a sequence of calls.
+  While the lease is active, calls of all other clients wait until the
+  lease is released or expires.
+
+The lock is reentrant for the thread holding exclusive access.
+"""
+
+import time
+import threading
+import contextlib
+
+
+class DeviceBusyError(Exception):
+    pass
+
+
+class DeviceLock:
+
+    def __init__(self):
+
+        self._cond = threading.Condition()
+
+        # Thread holding exclusive access and its recursion depth
+        self._writer = None
+        self._writer_depth = 0
+
+        # {thread_id: recursion depth} of threads holding shared access
+        self._readers = dict()
+
+        # Number of waiting callers:
+        #   exclusive ones (block new shared calls)
+        self._waiting_excl = 0
+        #   normal-priority ones (block low-priority calls)
+        self._waiting_normal = 0
+
+        # Exclusive lease
+        self._lease_owner = None
+        self._lease_expiry = 0
+
+    # Call access
+
+    def acquire(self, shared=False, low_priority=False, owner=None, timeout=None):
+        """Acquire access to the device. Blocks until access is granted.
+
+        :param shared: (bool) shared (read-only) access instead of exclusive one
+        :param low_priority: (bool) wait while any normal-priority call is waiting
+        :param owner: (str) [optional] ID of the client (to pass through own lease)
+        :param timeout: (float) max waiting time [s], None - wait infinitely
+
+        :return: (float) waiting time [s]
+                 DeviceBusyError is raised if timeout elapses
+        """
+
+        me = threading.get_ident()
+        start_time = time.time()
+
+        with self._cond:
+
+            if not self._can_enter(me, shared, low_priority, owner):
+
+                if not shared:
+                    self._waiting_excl += 1
+                if not low_priority:
+                    self._waiting_normal += 1
+
+                try:
+                    while not self._can_enter(me, shared, low_priority, owner):
+                        wait_time = self._wait_time(start_time, timeout)
+
+                        if wait_time is not None and wait_time <= 0:
+                            raise DeviceBusyError(
+                                'DeviceLock.acquire(): device is busy. '
+                                'Access was not granted within timeout={} s'.format(timeout)
+                            )
+
+                        self._cond.wait(wait_time)
+
+                finally:
+                    if not shared:
+                        self._waiting_excl -= 1
+                    if not low_priority:
+                        self._waiting_normal -= 1
+
+                    # Waiting counters changed: let others re-check
+                    self._cond.notify_all()
+
+            if self._writer == me:
+                # Reentrant call from the thread holding exclusive access
+                self._writer_depth += 1
+            elif shared:
+                self._readers[me] = self._readers.get(me, 0) + 1
+            else:
+                self._writer = me
+                self._writer_depth = 1
+
+        return time.time() - start_time
+
+    def release(self):
+
+        me = threading.get_ident()
+
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth -= 1
+                if self._writer_depth == 0:
+                    self._writer = None
+
+            elif me in self._readers:
+                self._readers[me] -= 1
+                if self._readers[me] == 0:
+                    del self._readers[me]
+
+            else:
+                raise RuntimeError('DeviceLock.release(): lock is not held by this thread')
+
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def hold(self, shared=False, low_priority=False, owner=None, timeout=None):
+        """Context manager version of acquire()/release()
+
+        Yields waiting time [s].
+        """
+
+        wait_time = self.acquire(
+            shared=shared,
+            low_priority=low_priority,
+            owner=owner,
+            timeout=timeout
+        )
+        try:
+            yield wait_time
+        finally:
+            self.release()
+
+    # Exclusive lease
+
+    def acquire_lease(self, owner, duration, timeout=None):
+        """Reserve the device for exclusive use by the owner.
+
+        :param owner: (str) client ID
+        :param duration: (float) lease duration [s]: the lease expires
+                         automatically, if it was not released in time
+        :param timeout: (float) max waiting time [s] for the current lease
+                        of a different owner to end. None - wait infinitely
+
+        :return: 0
+                 DeviceBusyError is raised if timeout elapses
+        """
+
+        start_time = time.time()
+
+        with self._cond:
+            while self._lease_active() and self._lease_owner != owner:
+                wait_time = self._wait_time(start_time, timeout)
+
+                if wait_time is not None and wait_time <= 0:
+                    raise DeviceBusyError(
+                        'DeviceLock.acquire_lease(): device is leased by "{}"'
+                        ''.format(self._lease_owner)
+                    )
+
+                self._cond.wait(wait_time)
+
+            self._lease_owner = owner
+            self._lease_expiry = time.time() + duration
+
+        return 0
+
+    def release_lease(self, owner):
+
+        with self._cond:
+            if self._lease_owner == owner:
+                self._lease_owner = None
+                self._lease_expiry = 0
+                self._cond.notify_all()
+
+        return 0
+
+    def get_lease_owner(self):
+        with self._cond:
+            if self._lease_active():
+                return self._lease_owner
+            else:
+                return None
+
+    # Technical methods
+
+    def _lease_active(self):
+        return self._lease_owner is not None and time.time() < self._lease_expiry
+
+    def _can_enter(self, me, shared, low_priority, owner):
+
+        # The thread holding exclusive access can always re-enter
+        if self._writer == me:
+            return True
+
+        # Device is leased by somebody else
+        if self._lease_active() and owner != self._lease_owner:
+            return False
+
+        # Reentrant shared call
+        if shared and me in self._readers:
+            return True
+
+        if self._writer is not None:
+            return False
+
+        # Measurement traffic goes first
+        if low_priority and self._waiting_normal > 0:
+            return False
+
+        if shared:
+            # Do not let new readers starve waiting exclusive call
+            return self._waiting_excl == 0
+        else:
+            return len(self._readers) == 0
+
+    def _wait_time(self, start_time, timeout):
+        """Time to wait until the next re-check: caller timeout or lease expiry"""
+
+        wait_list = []
+
+        if timeout is not None:
+            wait_list.append(timeout - (time.time() - start_time))
+
+        if self._lease_active():
+            wait_list.append(self._lease_expiry - time.time())
+
+        if wait_list:
+            return min(wait_list)
+        else:
+            return None
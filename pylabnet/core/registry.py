@@ -0,0 +1,318 @@
+""" Service registry: servers register name -> address, clients resolve by name.
+
+Start registry server (once per lab network):
+
+    registry_server = GenericServer(service=RegistryService(), host='0.0.0.0', port=REGISTRY_PORT)
+    registry_server.start()
+
+Servers register themselves on start:
+
+    ctr_server = GenericServer(
+        service=ctr_service, host='0.0.0.0', port=2001,
+        registry=('lab-pc-1', REGISTRY_PORT), name='gated_ctr', capabilities=('gated_ctr',)
+    )
+
+Clients resolve by name:
+
+    registry = RegistryClient(host='lab-pc-1', port=REGISTRY_PORT)
+    ctr = registry.connect_client(gated_ctr.Client, name='gated_ctr')
+
+Resolution happens only when the client is created: calls go directly
+to the server, the registry adds no latency to the call path. Resolved
+addresses are cached on the client side for cache_ttl.
+
+If several instances are registered under one name, the instance on the
+same machine is preferred (the client then uses the shared-memory path
+automatically).
+
+Registrations expire after ttl unless refreshed: GenericServer re-registers
+periodically, so entries of crashed servers disappear by themselves.
+"""
+
+import time
+import socket
+import pickle
+import threading
+from pylabnet.core.service_base import ServiceBase
+from pylabnet.core.client_base import ClientBase
+
+
+REGISTRY_PORT = 18800
+
+# Default lifetime [s] of a registration which is not refreshed
+REGISTRATION_TTL = 60
+
+
+class RegistryService(ServiceBase):
+
+    # Registry does not control any device
+    use_device_lock = False
+
+    def __init__(self):
+        super().__init__()
+
+        # {name: {(host, port): entry_dict}}
+        self._entries = dict()
+        self._entries_lock = threading.Lock()
+
+    def exposed_register(self, name, host, port, machine, capabilities=(), ttl=REGISTRATION_TTL):
+        """Register (or refresh) service instance
+
+        :param name: (str) service name
+        :param host: (str) host address clients should connect to
+        :param port: (int) server port
+        :param machine: (str) host name of the server machine
+        :param capabilities: (tuple of str) capabilities of the service
+        :param ttl: (float) [s] registration expires, if not refreshed within ttl
+        :return: 0
+        """
+
+        with self._entries_lock:
+            self._entries.setdefault(name, dict())[(host, port)] = dict(
+                name=name,
+                host=host,
+                port=port,
+                machine=machine,
+                capabilities=tuple(capabilities),
+                expiry=time.time() + ttl
+            )
+
+        return 0
+
+    def exposed_unregister(self, name, host, port):
+
+        with self._entries_lock:
+            instances = self._entries.get(name, dict())
+            instances.pop((host, port), None)
+
+            if not instances:
+                self._entries.pop(name, None)
+
+        return 0
+
+    def exposed_resolve(self, name):
+        """
+        :param name: (str) service name
+        :return: (bytes) pickled list of instance entries:
+                 dicts with name, host, port, machine, capabilities
+        """
+
+        with self._entries_lock:
+            self._drop_expired()
+            entry_list = list(self._entries.get(name, dict()).values())
+
+        return pickle.dumps(entry_list)
+
+    def exposed_list(self):
+        """
+        :return: (bytes) pickled dict {name: list of instance entries}
+        """
+
+        with self._entries_lock:
+            self._drop_expired()
+            entry_dict = {
+                name: list(instances.values())
+                for name, instances in self._entries.items()
+            }
+
+        return pickle.dumps(entry_dict)
+
+    def _drop_expired(self):
+        now = time.time()
+
+        for name in list(self._entries.keys()):
+            instances = self._entries[name]
+
+            for key in [key for key, entry in instances.items() if entry['expiry'] < now]:
+                del instances[key]
+
+            if not instances:
+                del self._entries[name]
+
+
+class RegistryClient(ClientBase):
+
+    def __init__(self, host, port=REGISTRY_PORT, cache_ttl=30, **kwargs):
+        """
+
+        :param host: (str) registry server host
+        :param port: (int) registry server port
+        :param cache_ttl: (float) [s] lifetime of locally cached resolutions
+        """
+
+        # {name: (entry_list, resolution_time)}
+        self._cache = dict()
+        self._cache_ttl = cache_ttl
+
+        super().__init__(host=host, port=port, **kwargs)
+
+    def register(self, name, host, port, capabilities=(), ttl=REGISTRATION_TTL):
+        return self._service.exposed_register(
+            name=name,
+            host=host,
+            port=port,
+            machine=socket.gethostname(),
+            capabilities=tuple(capabilities),
+            ttl=ttl
+        )
+
+    def unregister(self, name, host, port):
+        return self._service.exposed_unregister(
+            name=name,
+            host=host,
+            port=port
+        )
+
+    def resolve(self, name, fresh=False):
+        """All registered instances of the service
+
+        :param name: (str) service name
+        :param fresh: (bool) bypass local cache
+        :return: (list of dict) instance entries
+        """
+
+        if not fresh and name in self._cache:
+            entry_list, resolution_time = self._cache[name]
+
+            if time.time() - resolution_time < self._cache_ttl:
+                return entry_list
+
+        entry_list = pickle.loads(self._service.exposed_resolve(name=name))
+        self._cache[name] = (entry_list, time.time())
+
+        return entry_list
+
+    def list_services(self):
+        return pickle.loads(self._service.exposed_list())
+
+    def locate(self, name, capability=None, fresh=False):
+        """Address of the nearest instance of the service:
+        instance on the same machine is preferred
+
+        :param name: (str) service name
+        :param capability: (str) [optional] required capability
+        :param fresh: (bool) bypass local cache
+        :return: (tuple) (host, port)
+        """
+
+        entry = self._nearest(name=name, capability=capability, fresh=fresh)
+
+        return entry['host'], entry['port']
+
+    def connect_client(self, client_class, name, capability=None, **kwargs):
+        """Instantiate client of the nearest instance of the service
+
+            ctr = registry.connect_client(gated_ctr.Client, name='gated_ctr')
+
+        If connection fails, the name is resolved once again bypassing the cache
+        (the server could have moved).
+
+        Client of an instance on the same machine uses shared memory and no
+        compression, unless shm/compress are given in kwargs (the registered
+        address is not a loopback one, so the client can not tell it by itself).
+
+        :param client_class: client class (takes host and port arguments)
+        :param name: (str) service name
+        :param capability: (str) [optional] required capability
+        :param kwargs: other arguments of client_class constructor
+        :return: client instance
+        """
+
+        entry = self._nearest(name=name, capability=capability)
+
+        try:
+            return self._make_client(client_class, entry, kwargs)
+
+        except (socket.error, EOFError):
+            new_entry = self._nearest(name=name, capability=capability, fresh=True)
+
+            if (new_entry['host'], new_entry['port']) == (entry['host'], entry['port']):
+                raise
+
+            return self._make_client(client_class, new_entry, kwargs)
+
+    # Technical methods
+
+    def _nearest(self, name, capability=None, fresh=False):
+        # Entry of the nearest instance (see locate())
+
+        entry_list = self.resolve(name=name, fresh=fresh)
+
+        if capability is not None:
+            entry_list = [entry for entry in entry_list if capability in entry['capabilities']]
+
+        if not entry_list:
+            raise LookupError('locate(): no registered instance of "{}"'.format(name))
+
+        this_machine = socket.gethostname()
+        entry_list = sorted(entry_list, key=lambda entry: entry['machine'] != this_machine)
+
+        return entry_list[0]
+
+    @staticmethod
+    def _make_client(client_class, entry, kwargs):
+
+        if entry['machine'] == socket.gethostname():
+            kwargs = dict(kwargs)
+            kwargs.setdefault('shm', True)
+            kwargs.setdefault('compress', False)
+
+        return client_class(host=entry['host'], port=entry['port'], **kwargs)
+
+
+def is_loopback(host):
+    """
+    :param host: (str) host name or address
+    :return: (bool) True if host is only reachable from this machine
+    """
+
+    return host in ('localhost', '::1') or host.startswith('127.')
+
+
+def registered_host(host, registry_host=None):
+    """Address to register for the server bound to host
+
+    Servers bound to all interfaces register the IP address of the machine
+    (of the interface on the route to the registry, if registry_host is given).
+
+    :param host: (str) address the server is bound to
+    :param registry_host: (str) [optional] registry host
+    :return: (str) address reachable from other machines
+    :raises ValueError: server is bound to a loopback address
+    """
+
+    if is_loopback(host):
+        raise ValueError(
+            'Server bound to "{}" is not reachable from other machines '
+            'and cannot be registered'.format(host)
+        )
+
+    if host in ('', '0.0.0.0', '::'):
+        return _machine_ip(registry_host)
+
+    return host
+
+
+def _machine_ip(registry_host=None):
+
+    # Source address of the route to the registry or, if it is local,
+    # to any external address (connect() of UDP socket sends no packets)
+    for target in (registry_host, '8.8.8.8'):
+        if target is None:
+            continue
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.connect((target, REGISTRY_PORT))
+            ip = sock.getsockname()[0]
+            if not is_loopback(ip):
+                return ip
+        except socket.error:
+            pass
+        finally:
+            sock.close()
+
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except socket.error:
+        return socket.gethostname()
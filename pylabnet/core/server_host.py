@@ -0,0 +1,293 @@
+""" Multi-process server host.
+
+GenericServer runs the server in a thread of the caller's process. All
+services started in one Python process share one GIL, so CPU-heavy work of
+one driver (e.g. waveform compilation in ni654x.Driver.write_wfm() or
+AWG _calc_byte_ar()) delays every other service of this process.
+
+ServerHost runs each service (or a group of services) in its own process:
+
+    def make_ctr_service():
+        # Called in the child process: hardware is opened there
+        ctr = gated_ctr.GatedCtr(...)
+        service = gated_ctr.Service()
+        service.assign_module(module=ctr)
+        return service
+
+    host = ServerHost()
+    host.add_service(name='ctr', make_service=make_ctr_service, port=2001)
+    host.add_service(name='p_gen', make_service=make_p_gen_service, port=2002)
+    host.start()
+    host.serve_status(port=2000)
+
+make_service must be a module-level (picklable) function. Services sharing
+a group name run in one process.
+
+Lifecycle of each group is controlled by start()/stop()/restart(), status of
+all groups is reported by status() and, remotely, by ServerHostService
+(see ServerHostClient).
+"""
+
+import pickle
+import multiprocessing
+from pylabnet.core.service_base import ServiceBase
+from pylabnet.core.client_base import ClientBase
+from pylabnet.core.generic_server import GenericServer
+
+
+class ServerHost:
+
+    def __init__(self, stop_timeout=10):
+        """
+
+        :param stop_timeout: (float) [s] time for a group process to stop
+                             its servers, after which the process is terminated
+        """
+
+        self._stop_timeout = stop_timeout
+
+        # {group_name: [service_spec_dict]}
+        self._groups = dict()
+
+        # {group_name: (Process, stop Event)}
+        self._procs = dict()
+
+        # {group_name: number of restarts}
+        self._restarts = dict()
+
+        self._status_server = None
+
+    def add_service(self, name, make_service, port, host='localhost', group=None, kwargs=None):
+        """Register service to run
+
+        :param name: (str) service name
+        :param make_service: (callable) make_service(**kwargs) is called in the
+                             child process and returns service instance
+                             (with hardware module assigned)
+        :param port: (int) server port
+        :param host: (str) server host
+        :param group: (str) [optional] name of the process group.
+                      None - service gets its own process (group = name)
+        :param kwargs: (dict) [optional] keyword arguments for make_service
+        :return: 0
+        """
+
+        group = name if group is None else group
+
+        if self._is_alive(group):
+            raise RuntimeError(
+                'add_service(): group "{}" is running. Stop it first'.format(group)
+            )
+
+        self._groups.setdefault(group, []).append(
+            dict(
+                name=name,
+                make_service=make_service,
+                port=port,
+                host=host,
+                kwargs=dict() if kwargs is None else kwargs
+            )
+        )
+        self._restarts.setdefault(group, 0)
+
+        return 0
+
+    # Lifecycle control
+
+    def start(self, group=None):
+        """Start group process
+
+        :param group: (str) group name. None - start all groups
+        :return: 0
+        """
+
+        for group_name in self._select(group):
+            if self._is_alive(group_name):
+                continue
+
+            stop_event = multiprocessing.Event()
+            proc = multiprocessing.Process(
+                target=_run_group,
+                args=(self._groups[group_name], stop_event),
+                name='pylabnet-{}'.format(group_name),
+                daemon=True
+            )
+            proc.start()
+
+            self._procs[group_name] = (proc, stop_event)
+
+        return 0
+
+    def stop(self, group=None):
+        """Stop group process: servers are closed, then the process exits.
+        If it does not exit within stop_timeout, it is terminated.
+
+        :param group: (str) group name. None - stop all groups
+        :return: 0
+        """
+
+        group_list = self._select(group)
+
+        # Signal all processes first, such that they shut down in parallel
+        for group_name in group_list:
+            if group_name in self._procs:
+                self._procs[group_name][1].set()
+
+        for group_name in group_list:
+            if group_name not in self._procs:
+                continue
+
+            proc, _ = self._procs.pop(group_name)
+
+            proc.join(self._stop_timeout)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+
+        return 0
+
+    def restart(self, group=None):
+        """Stop and start group process
+
+        :param group: (str) group name. None - restart all groups
+        :return: 0
+        """
+
+        self.stop(group=group)
+
+        for group_name in self._select(group):
+            self._restarts[group_name] += 1
+
+        return self.start(group=group)
+
+    def status(self):
+        """Status of all groups
+
+        :return: (dict) {group_name: {
+                            'alive': (bool),
+                            'pid': (int) process ID or None,
+                            'exitcode': (int) exit code or None,
+                            'restarts': (int) number of restarts,
+                            'services': [(name, host, port)]
+                        }}
+        """
+
+        status_dict = dict()
+
+        for group_name, spec_list in self._groups.items():
+            if group_name in self._procs:
+                proc = self._procs[group_name][0]
+                pid, exitcode, alive = proc.pid, proc.exitcode, proc.is_alive()
+            else:
+                pid, exitcode, alive = None, None, False
+
+            status_dict[group_name] = dict(
+                alive=alive,
+                pid=pid,
+                exitcode=exitcode,
+                restarts=self._restarts[group_name],
+                services=[(spec['name'], spec['host'], spec['port']) for spec in spec_list]
+            )
+
+        return status_dict
+
+    # Status endpoint
+
+    def serve_status(self, port, host='localhost'):
+        """Start status/control server (in this process)
+
+        :param port: (int) server port
+        :param host: (str) server host
+        :return: 0
+        """
+
+        host_service = ServerHostService()
+        host_service.assign_module(module=self)
+
+        self._status_server = GenericServer(service=host_service, host=host, port=port)
+        self._status_server.start()
+
+        return 0
+
+    def close(self):
+        """Stop all groups and the status server"""
+
+        self.stop()
+
+        if self._status_server is not None:
+            self._status_server.stop()
+            self._status_server = None
+
+        return 0
+
+    # Technical methods
+
+    def _select(self, group):
+        if group is None:
+            return list(self._groups.keys())
+
+        if group not in self._groups:
+            raise ValueError('Unknown group "{}"'.format(group))
+
+        return [group]
+
+    def _is_alive(self, group):
+        return group in self._procs and self._procs[group][0].is_alive()
+
+
+def _run_group(spec_list, stop_event):
+    """Entry point of the group process"""
+
+    server_list = []
+
+    try:
+        for spec in spec_list:
+            service = spec['make_service'](**spec['kwargs'])
+
+            server = GenericServer(
+                service=service,
+                host=spec['host'],
+                port=spec['port']
+            )
+            server.start()
+            server_list.append(server)
+
+        stop_event.wait()
+
+    finally:
+        for server in server_list:
+            server.stop()
+
+
+class ServerHostService(ServiceBase):
+
+    # Status polls go after start/stop/restart requests
+    low_priority_methods = ('get_status',)
+
+    def exposed_get_status(self):
+        return pickle.dumps(self._module.status())
+
+    def exposed_start(self, group=None):
+        return self._module.start(group=group)
+
+    def exposed_stop(self, group=None):
+        return self._module.stop(group=group)
+
+    def exposed_restart(self, group=None):
+        return self._module.restart(group=group)
+
+
+class ServerHostClient(ClientBase):
+
+    def get_status(self):
+        res_pickle = self._service.exposed_get_status()
+        return pickle.loads(res_pickle)
+
+    def start(self, group=None):
+        return self._service.exposed_start(group=group)
+
+    def stop(self, group=None):
+        return self._service.exposed_stop(group=group)
+
+    def restart(self, group=None):
+        return self._service.exposed_restart(group=group)
@@ -1,5 +1,29 @@
 import rpyc
+import time
+import json
+import pickle
+import functools
+import inspect
+import itertools
+import threading
+import contextlib
+import traceback
 from pylabnet.utils.logging.logger import LogHandler
+from pylabnet.core.mutex import DeviceLock
+from pylabnet.core.coalescing import CallCoalescer, make_call_key
+from pylabnet.core.metrics import CallMetrics, payload_size
+from pylabnet.core.transport import encode_result, can_pack, shm_available, ShmPool, TRANSPORT_KW, SHM_MIN_SIZE
+from pylabnet.core.transport import available_codecs, compress_result, decompress_args, CompressionStats
+from pylabnet.core.subscription import Subscription
+
+
+def _handles_dispatch(func):
+    """Mark exposed method, which receives client transport options as is
+    and dispatches the calls by itself (it is not wrapped by _wrap_exposed)
+    """
+
+    func._dispatched = True
+    return func
 
 
 class ServiceBase(rpyc.Service):
@@ -7,6 +31,87 @@ class ServiceBase(rpyc.Service):
     _module = None
     log = LogHandler()
 
+    # Device access control (see pylabnet.core.mutex).
+    # Method names are given without 'exposed_' prefix.
+    #   cheap getters, which only read device state and
+    #   can run simultaneously with each other
+    shared_methods = ()
+    #   status polls: wait while any measurement call is waiting
+    low_priority_methods = ()
+    #   methods which do not take the device lock at all
+    #   (e.g. long waits, which synchronize by themselves)
+    unlocked_methods = ()
+    #   max time [s] a call waits for the device. None - wait infinitely
+    lock_timeout = None
+    #   set to False to disable device locking for the service
+    use_device_lock = True
+
+    # Read-only methods, whose identical concurrent calls are coalesced
+    # (see pylabnet.core.coalescing):
+    #   {method_name: result TTL [s]}, TTL = 0 - coalesce in-flight calls only.
+    # Calls of all other methods invalidate kept results.
+    coalesced_methods = dict()
+
+    # Per-call metrics (see pylabnet.core.metrics)
+    #   set to False to disable metrics collection for the service
+    collect_metrics = True
+    #   rolling window [s] of timing histograms
+    metrics_window = 60
+
+    # Exposed methods of ServiceBase itself, which never touch the device
+    _lock_free_methods = (
+        'subscribe',
+        'unsubscribe',
+        'release_shm',
+        'acquire_lease',
+        'release_lease',
+        'get_lease_owner',
+        'get_codecs',
+        'get_compression_stats',
+        'get_metrics'
+    )
+
+    def __init__(self):
+        super().__init__()
+
+        # Server-push subscriptions
+        #   {sub_id: Subscription}
+        self._subs = dict()
+        self._subs_lock = threading.Lock()
+        self._sub_id_counter = itertools.count(start=1)
+        #   {topic: threading.Event} - stop flags of streaming threads
+        self._streams = dict()
+
+        # Shared memory segments waiting to be read out by same-host clients
+        self._shm_pool = ShmPool() if shm_available() else None
+
+        # One lock per service instance, that is per device
+        self._device_lock = DeviceLock() if self.use_device_lock else None
+
+        self._coalescer = CallCoalescer()
+
+        # Lock owner of the call served by the current thread
+        # (see device_access())
+        self._call_context = threading.local()
+
+        # Compression counters of remote transfers
+        self._compression_stats = CompressionStats()
+
+        # Per-call metrics and tracing hooks
+        if self.collect_metrics:
+            self._metrics = CallMetrics(window=self.metrics_window)
+        else:
+            self._metrics = None
+        self._call_hooks = []
+        self._metrics_dump_stop = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # Route every exposed method, defined in the subclass,
+        # through ServiceBase._dispatch()
+        _wrap_all_exposed(cls)
+
     def on_connect(self, conn):
         # code that runs when a connection is created
         # (to init the service, if needed)
@@ -22,3 +127,581 @@ class ServiceBase(rpyc.Service):
 
     def assign_logger(self, logger=None):
         self.log = LogHandler(logger=logger)
+
+    # Server-push subscriptions
+
+    def exposed_subscribe(self, topic, callback, max_queue=16):
+        """Register callback to receive data published for the topic.
+
+        :param topic: (str) topic name (see publish() calls of the service)
+        :param callback: (callable) callback(data) - called on the client side
+                         for each published item
+        :param max_queue: (int) max number of items waiting for delivery.
+                          If the client falls behind, the oldest items are dropped.
+        :return: (int) subscription ID
+        """
+
+        with self._subs_lock:
+            sub_id = next(self._sub_id_counter)
+
+            self._subs[sub_id] = Subscription(
+                sub_id=sub_id,
+                topic=topic,
+                callback=callback,
+                max_queue=max_queue,
+                on_close=self._drop_sub,
+                log=self.log
+            )
+
+        return sub_id
+
+    def exposed_unsubscribe(self, sub_id):
+        """Cancel subscription.
+
+        :param sub_id: (int) subscription ID
+        :return: (int) number of items dropped due to queue overflow
+                 during the subscription lifetime
+        """
+
+        with self._subs_lock:
+            sub = self._subs.pop(sub_id, None)
+
+        if sub is None:
+            return 0
+
+        return sub.close()
+
+    def has_subscribers(self, topic):
+        with self._subs_lock:
+            return any(sub.topic == topic for sub in self._subs.values())
+
+    def publish(self, topic, data):
+        """Push new data to all subscribers of the topic. Never blocks.
+
+        :param topic: (str) topic name
+        :param data: data to send (numpy arrays are sent as array envelopes)
+        :return: (int) number of subscribers the data was queued for
+        """
+
+        with self._subs_lock:
+            sub_list = [sub for sub in self._subs.values() if sub.topic == topic]
+
+        if not sub_list:
+            return 0
+
+        # Pack data once for all subscribers
+        data = encode_result(data)
+
+        for sub in sub_list:
+            sub.push(data)
+
+        return len(sub_list)
+
+    def start_streaming(self, topic, get_data, period):
+        """Periodically publish get_data() until stop_streaming(topic) is called.
+
+        get_data() is only called while the topic has subscribers.
+
+        :param topic: (str) topic name
+        :param get_data: (callable) function returning the data to publish
+        :param period: (float) publishing period [s]
+        :return: 0
+        """
+
+        self.stop_streaming(topic=topic)
+
+        stop_event = threading.Event()
+        self._streams[topic] = stop_event
+
+        stream_thread = threading.Thread(
+            target=self._stream,
+            args=(topic, get_data, period, stop_event),
+            daemon=True
+        )
+        stream_thread.start()
+
+        return 0
+
+    def stop_streaming(self, topic):
+        stop_event = self._streams.pop(topic, None)
+
+        if stop_event is not None:
+            stop_event.set()
+
+        return 0
+
+    def _stream(self, topic, get_data, period, stop_event):
+
+        while not stop_event.is_set():
+
+            if self.has_subscribers(topic):
+                try:
+                    with self.device_access(shared=True, low_priority=True):
+                        data = get_data()
+
+                    self.publish(topic=topic, data=data)
+                except Exception:
+                    self.log.exception(
+                        'Streaming of topic "{}" failed and was stopped'.format(topic)
+                    )
+                    return
+
+                stop_event.wait(period)
+
+            else:
+                # Nobody listens - check again later
+                stop_event.wait(max(period, 0.1))
+
+    # Device access control
+
+    def exposed_acquire_lease(self, owner, duration=60, timeout=None):
+        """Reserve the device for exclusive use by one client.
+
+        While the lease is active, calls of all other clients wait
+        until the lease is released or expires.
+
+        :param owner: (str) client ID
+        :param duration: (float) lease duration [s]
+        :param timeout: (float) max waiting time [s] for the lease of another
+                        client to end. None - wait infinitely
+        :return: 0
+        """
+
+        if self._device_lock is None:
+            return 0
+
+        return self._device_lock.acquire_lease(
+            owner=owner,
+            duration=duration,
+            timeout=timeout
+        )
+
+    def exposed_release_lease(self, owner):
+        if self._device_lock is None:
+            return 0
+
+        return self._device_lock.release_lease(owner=owner)
+
+    def exposed_get_lease_owner(self):
+        if self._device_lock is None:
+            return None
+
+        return self._device_lock.get_lease_owner()
+
+    def device_access(self, shared=False, low_priority=False, owner=None):
+        """Context manager to access the device from a service-side thread
+        (streaming, publishing), which does not go through exposed methods,
+        or from an exposed method listed in unlocked_methods.
+
+        Yields waiting time [s].
+
+        :param owner: (str) [optional] lock owner. None - owner of the call
+                      served by the current thread (if any): an unlocked method
+                      of the lease holder passes through the lease
+        """
+
+        if self._device_lock is None:
+            return contextlib.nullcontext(0)
+
+        if owner is None:
+            owner = getattr(self._call_context, 'owner', None)
+
+        return self._device_lock.hold(
+            shared=shared,
+            low_priority=low_priority,
+            owner=owner,
+            timeout=self.lock_timeout
+        )
+
+    # Batched calls
+
+    @_handles_dispatch
+    def exposed_batch(self, calls, **kwargs):
+        """Execute a list of exposed method calls in one request
+        (see ClientBase.batch()).
+
+        Calls are executed in order under exclusive device access
+        (other clients can not interleave). Execution stops
+        at the first exception. Calls of coalesced_methods are not coalesced:
+        joining a call of another client, which waits for the device lock
+        held by the batch, would deadlock.
+
+        :param calls: (tuple) of (method_name, args, kwargs_items),
+                      method_name without 'exposed_' prefix
+        :param kwargs: client transport options (TRANSPORT_KW),
+                       forwarded to each call
+
+        :return: (tuple) (results, error)
+                 results - tuple of return values of executed calls,
+                 error - None or (call_index, exc_type_name, exc_msg, traceback_str)
+        """
+
+        transport_opts = kwargs.get(TRANSPORT_KW, ())
+        results = []
+        error = None
+
+        with self.device_access(owner=dict(transport_opts).get('owner')):
+            for index, (method_name, args, kwargs_items) in enumerate(calls):
+
+                call_kwargs = dict(kwargs_items)
+                if transport_opts:
+                    call_kwargs[TRANSPORT_KW] = transport_opts
+
+                try:
+                    method = getattr(type(self), 'exposed_' + method_name)
+
+                    # Original method of the _dispatch() wrapper
+                    func = getattr(method, '__wrapped__', None)
+
+                    if func is None:
+                        # Method dispatches the call by itself
+                        results.append(method(self, *args, **call_kwargs))
+                    else:
+                        results.append(
+                            self._dispatch(func, args, call_kwargs, coalesce=False)
+                        )
+
+                except Exception as exc_obj:
+                    error = (
+                        index,
+                        type(exc_obj).__name__,
+                        str(exc_obj),
+                        traceback.format_exc()
+                    )
+                    break
+
+        return tuple(results), error
+
+    # Shared-memory transport
+
+    def exposed_release_shm(self, name):
+        """Destroy shared memory segment after the client has read it out
+
+        :param name: (str) segment name
+        :return: 0
+        """
+
+        if self._shm_pool is not None:
+            self._shm_pool.release(name=name)
+
+        return 0
+
+    # Compression
+
+    def exposed_get_codecs(self):
+        """Compression codecs supported by the server (used for negotiation)
+
+        :return: (tuple of str) codec names in the order of preference
+        """
+
+        return available_codecs()
+
+    def exposed_get_compression_stats(self):
+        """
+        :return: (bytes) pickled dict of compression counters,
+                 see CompressionStats.as_dict()
+        """
+
+        return pickle.dumps(self._compression_stats.as_dict())
+
+    # Per-call metrics
+
+    def exposed_get_metrics(self):
+        """
+        :return: (bytes) pickled dict of per-method metrics,
+                 see CallMetrics.snapshot(). None if metrics are disabled.
+        """
+
+        if self._metrics is None:
+            return None
+
+        return pickle.dumps(self._metrics.snapshot())
+
+    def add_call_hook(self, hook):
+        """Register tracing hook, called after every exposed method call:
+
+            hook(method_name, record)
+
+        record - dict with wait/exec/serialize times [s], bytes_in/bytes_out,
+        and error (bool). Hook is called in the serving thread and should be fast.
+
+        :param hook: (callable)
+        :return: 0
+        """
+
+        self._call_hooks.append(hook)
+        return 0
+
+    def remove_call_hook(self, hook):
+        if hook in self._call_hooks:
+            self._call_hooks.remove(hook)
+        return 0
+
+    def start_metrics_dump(self, file_path, period=60):
+        """Periodically append metrics snapshot to a file (one JSON object per line)
+
+        :param file_path: (str) path to the file
+        :param period: (float) dump period [s]
+        :return: 0
+        """
+
+        if self._metrics is None:
+            raise RuntimeError('start_metrics_dump(): metrics are disabled for this service')
+
+        self.stop_metrics_dump()
+
+        stop_event = threading.Event()
+        self._metrics_dump_stop = stop_event
+
+        dump_thread = threading.Thread(
+            target=self._dump_metrics,
+            args=(file_path, period, stop_event),
+            daemon=True
+        )
+        dump_thread.start()
+
+        return 0
+
+    def stop_metrics_dump(self):
+        if self._metrics_dump_stop is not None:
+            self._metrics_dump_stop.set()
+            self._metrics_dump_stop = None
+
+        return 0
+
+    def _dump_metrics(self, file_path, period, stop_event):
+
+        while not stop_event.wait(period):
+            try:
+                with open(file_path, 'a') as dump_file:
+                    dump_file.write(json.dumps(self._metrics.snapshot()) + '\n')
+            except Exception:
+                self.log.exception(
+                    'Metrics dump into "{}" failed and was stopped'.format(file_path)
+                )
+                return
+
+    def _drop_sub(self, sub):
+        with self._subs_lock:
+            self._subs.pop(sub.sub_id, None)
+
+        self.log.info(
+            'Subscriber of topic "{0}" is gone. Subscription {1} was closed'
+            ''.format(sub.topic, sub.sub_id)
+        )
+
+    def _dispatch(self, func, args, kwargs, coalesce=True):
+        """Execute exposed method and prepare the result for sending.
+
+        The method is executed under the device lock (see pylabnet.core.mutex),
+        according to shared_methods/low_priority_methods/unlocked_methods.
+        Identical concurrent calls of coalesced_methods are executed only once.
+
+        numpy arrays are packed into array envelope
+        (see pylabnet.core.transport) instead of being sent as netrefs.
+
+        :param func: (function) original (unwrapped) exposed method
+        :param args: (tuple) positional arguments of the call
+        :param kwargs: (dict) keyword arguments of the call
+                       (may contain client transport options)
+        :param coalesce: (bool) False - always execute the call itself,
+                         even if it is one of coalesced_methods
+        :return: return value of the exposed method, ready for sending
+        """
+
+        t_start = time.perf_counter()
+
+        transport_opts = dict(kwargs.pop(TRANSPORT_KW, ()))
+
+        # Large bytes arguments were compressed by the client
+        if transport_opts.get('zargs', False):
+            args, kwargs = decompress_args(args, kwargs, stats=self._compression_stats)
+
+        name = func.__name__[len('exposed_'):]
+
+        t_exec_start = time.perf_counter()
+        wait_time = 0
+
+        prev_owner = getattr(self._call_context, 'owner', None)
+        self._call_context.owner = transport_opts.get('owner')
+
+        try:
+            if coalesce and name in self.coalesced_methods:
+                call_key = make_call_key(
+                    name, args, kwargs,
+                    owner=transport_opts.get('owner')
+                )
+            else:
+                call_key = None
+
+            if call_key is not None:
+                res, wait_time = self._coalescer.call(
+                    key=call_key,
+                    func=lambda: self._execute(name, func, args, kwargs, transport_opts),
+                    ttl=self.coalesced_methods[name]
+                )
+
+            elif (
+                not self.coalesced_methods
+                or name in self.coalesced_methods
+                or name in self._lock_free_methods
+            ):
+                res, wait_time = self._execute(name, func, args, kwargs, transport_opts)
+
+            else:
+                # Device state might change: drop kept results
+                # (also the ones stored by calls which overtook this one)
+                self._coalescer.invalidate()
+                try:
+                    res, wait_time = self._execute(name, func, args, kwargs, transport_opts)
+                finally:
+                    self._coalescer.invalidate()
+
+        except Exception:
+            t_end = time.perf_counter()
+            self._record_call(
+                name=name,
+                wait=wait_time,
+                exec_time=t_end - t_exec_start,
+                serialize=t_exec_start - t_start,
+                args=args,
+                kwargs=kwargs,
+                res=None,
+                error=True
+            )
+            raise
+
+        finally:
+            self._call_context.owner = prev_owner
+
+        t_exec_end = time.perf_counter()
+
+        # Serialization does not need the device
+        res = self._encode(
+            res=res,
+            transport_opts=transport_opts
+        )
+
+        t_end = time.perf_counter()
+
+        self._record_call(
+            name=name,
+            wait=wait_time,
+            exec_time=t_exec_end - t_exec_start - wait_time,
+            serialize=(t_exec_start - t_start) + (t_end - t_exec_end),
+            args=args,
+            kwargs=kwargs,
+            res=res
+        )
+
+        return res
+
+    def _execute(self, name, func, args, kwargs, transport_opts):
+        """Execute exposed method under the device lock
+
+        :return: (tuple) (result, lock waiting time [s])
+        """
+
+        if (
+            self._device_lock is None
+            or name in self._lock_free_methods
+            or name in self.unlocked_methods
+        ):
+            return func(self, *args, **kwargs), 0
+
+        with self._device_lock.hold(
+            shared=name in self.shared_methods,
+            low_priority=name in self.low_priority_methods,
+            owner=transport_opts.get('owner'),
+            timeout=self.lock_timeout
+        ) as wait_time:
+            return func(self, *args, **kwargs), wait_time
+
+    def _record_call(self, name, wait, exec_time, serialize, args, kwargs, res, error=False):
+
+        if self._metrics is None and not self._call_hooks:
+            return
+
+        bytes_in = payload_size(args) + payload_size(kwargs)
+        bytes_out = payload_size(res)
+
+        if self._metrics is not None:
+            self._metrics.record(
+                name=name,
+                wait=wait,
+                exec_time=exec_time,
+                serialize=serialize,
+                bytes_in=bytes_in,
+                bytes_out=bytes_out,
+                error=error
+            )
+
+        if self._call_hooks:
+            record = dict(
+                wait=wait,
+                exec=exec_time,
+                serialize=serialize,
+                bytes_in=bytes_in,
+                bytes_out=bytes_out,
+                error=error
+            )
+            for hook in list(self._call_hooks):
+                try:
+                    hook(name, record)
+                except Exception:
+                    self.log.warn('Call hook {} raised an exception'.format(hook))
+
+    def _encode(self, res, transport_opts):
+
+        # In-process client receives the object itself
+        if transport_opts.get('local', False):
+            return res
+
+        # Large arrays for same-host clients go through shared memory
+        if (
+            transport_opts.get('shm', False)
+            and self._shm_pool is not None
+            and can_pack(res)
+            and res.nbytes >= SHM_MIN_SIZE
+        ):
+            return self._shm_pool.pack_array(res)
+
+        # Large payload for remote clients is compressed with the negotiated codec
+        codec = transport_opts.get('codec', None)
+        if codec is not None:
+            z_res = compress_result(res, codec=codec, stats=self._compression_stats)
+            if z_res is not None:
+                return z_res
+
+        return encode_result(res)
+
+
+def _wrap_all_exposed(cls):
+    for attr_name, attr in list(vars(cls).items()):
+        if attr_name.startswith('exposed_') and inspect.isfunction(attr):
+            setattr(cls, attr_name, _wrap_exposed(attr))
+
+
+def _wrap_exposed(func):
+    """Wrap exposed method, such that the call goes through ServiceBase._dispatch()
+
+    :param func: (function) exposed method
+    :return: (function) wrapped method
+    """
+
+    # Already wrapped (for example, inherited method re-assigned in a subclass)
+    if getattr(func, '_dispatched', False):
+        return func
+
+    @functools.wraps(func)
+    def exposed_method(self, *args, **kwargs):
+        return self._dispatch(func, args, kwargs)
+
+    exposed_method._dispatched = True
+
+    return exposed_method
+
+
+# Exposed methods of ServiceBase itself go through _dispatch() as well
+# (in particular, they accept client transport options)
+_wrap_all_exposed(ServiceBase)
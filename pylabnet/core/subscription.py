@@ -0,0 +1,104 @@
+""" Server-push subscriptions for ServiceBase.
+
+Instead of polling, a client registers a callback for a topic
+(ClientBase.subscribe()). Every time the service publishes new data
+for this topic (ServiceBase.publish()), the data is pushed into a
+bounded per-subscriber queue. A dedicated sender thread delivers queued
+items by calling the client callback through the RPyC link.
+
+Backpressure: the sender waits for the client to process each item.
+If the client falls behind, the oldest queued items are dropped
+(and counted), such that the publishing hardware module is never blocked.
+"""
+
+import collections
+import threading
+from pylabnet.utils.logging.logger import LogHandler
+
+
+class Subscription:
+
+    def __init__(self, sub_id, topic, callback, max_queue, on_close=None, log=None):
+        """Instantiate subscription and start sender thread
+
+        :param sub_id: (int) subscription ID
+        :param topic: (str) topic name
+        :param callback: (callable) callback (netref to client-side function)
+        :param max_queue: (int) max number of items waiting for delivery
+        :param on_close: (callable) [optional] on_close(subscription) is called
+                         when the subscriber is gone (connection is closed)
+        :param log: (LogHandler) [optional] log handler
+        """
+
+        self.sub_id = sub_id
+        self.topic = topic
+
+        # Number of items dropped due to queue overflow
+        self.dropped = 0
+
+        self._callback = callback
+        self._on_close = on_close
+        self._log = log if log is not None else LogHandler()
+
+        self._queue = collections.deque(maxlen=max(int(max_queue), 1))
+        self._cond = threading.Condition()
+        self._active = True
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def push(self, data):
+        """Put new item into delivery queue. Never blocks.
+
+        :param data: item to deliver (must be sendable by value)
+        """
+
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                # deque drops the oldest item on append
+                self.dropped += 1
+
+            self._queue.append(data)
+            self._cond.notify()
+
+    def close(self):
+        """Stop delivery. Items remaining in the queue are discarded.
+
+        :return: (int) number of items dropped due to queue overflow
+        """
+
+        with self._cond:
+            self._active = False
+            self._queue.clear()
+            self._cond.notify()
+
+        return self.dropped
+
+    def _run(self):
+
+        while True:
+            with self._cond:
+                while self._active and not self._queue:
+                    self._cond.wait()
+
+                if not self._active:
+                    return
+
+                data = self._queue.popleft()
+
+            try:
+                self._callback(data)
+
+            # Connection to the subscriber is lost
+            except (EOFError, ReferenceError):
+                self.close()
+                if self._on_close is not None:
+                    self._on_close(self)
+                return
+
+            # Exception in the client callback should not stop delivery
+            except Exception:
+                self._log.warn(
+                    'Subscription(topic={0}, sub_id={1}): '
+                    'client callback raised an exception'.format(self.topic, self.sub_id)
+                )
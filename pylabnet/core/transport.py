@@ -0,0 +1,599 @@
+""" Array envelope to ship numpy arrays through RPyC links.
+
+Instead of pickling an array into a bytes object on the server side and
+unpickling it on the client side, the array is sent as a flat tuple
+
+    (ENVELOPE_TAG, dtype_str, shape, raw_bytes)
+
+Such a tuple contains only immutable built-in types, so RPyC passes it
+by value in one go. On the client side, the array is reconstructed from
+the received bytes object with one memory copy (no unpickling), or is
+copied into a preallocated client-side buffer. Received arrays are always
+writable and owned by the caller, whichever path (socket, shared memory,
+compressed) delivered them.
+
+ServiceBase applies pack_array() to all ndarray return values of exposed
+methods and ClientBase applies unpack_array() to all received envelopes,
+so Service/Client classes can just return/receive numpy arrays.
+
+Shared-memory fast path: if client and server run on the same host,
+large arrays are placed into a named shared memory segment and only the
+handle travels through the link:
+
+    (SHM_ENVELOPE_TAG, dtype_str, shape, segment_name)
+
+The server keeps the segment open until the client reports that the data
+was read out (or until the segment expires), see ShmPool.
+Requires multiprocessing.shared_memory (Python 3.8+). On older
+interpreters, the shared-memory path is silently disabled.
+
+Compression: remote clients negotiate a codec with the server on connect
+(zlib is always available, lz4 and zstd - if installed). Arrays and bytes
+objects above COMPRESS_MIN_SIZE are then sent compressed in both directions:
+
+    (Z_ENVELOPE_TAG, dtype_str, shape, codec, compressed_bytes)
+    (Z_BYTES_TAG, codec, compressed_bytes)
+
+Payload, which does not compress well, is sent as is.
+
+In-process clients (see pylabnet.core.client_base.local_client()) call the
+service directly: with the 'local' transport option, return values are
+passed as is (no envelope, no copy).
+
+Transport options of the client are sent with each call as a reserved
+keyword argument TRANSPORT_KW, which is consumed by ServiceBase.
+"""
+
+import os
+import time
+import zlib
+import threading
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError:
+    shared_memory = None
+    resource_tracker = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ENVELOPE_TAG = '__pylabnet_ndarray__'
+SHM_ENVELOPE_TAG = '__pylabnet_shm__'
+
+# Reserved keyword argument to pass client transport options with a call:
+#   tuple of (option_name, value) pairs, e.g. (('shm', True),)
+TRANSPORT_KW = '_transport'
+
+# Arrays smaller than this [bytes] are always sent through the socket:
+# for them, shared memory setup costs more than the copy
+SHM_MIN_SIZE = 2**18
+
+Z_ENVELOPE_TAG = '__pylabnet_ndarray_z__'
+Z_BYTES_TAG = '__pylabnet_bytes_z__'
+
+# Payloads smaller than this [bytes] are never compressed
+COMPRESS_MIN_SIZE = 2**14
+
+# Compressed payload is sent only if it is smaller than
+# this fraction of the raw size
+COMPRESS_MAX_RATIO = 0.9
+
+
+# Names of shared memory segments created by ShmPool in this process
+_own_segments = set()
+
+
+def shm_available():
+    return shared_memory is not None
+
+
+def can_pack(obj):
+    """Check if the object can be shipped as an array envelope.
+
+    Object arrays and structured arrays cannot be represented
+    by (dtype_str, shape, raw_bytes) and are not packed.
+
+    :param obj: any object
+    :return: (bool) True if obj is a plain numeric numpy array
+    """
+
+    return (
+        isinstance(obj, np.ndarray)
+        and not obj.dtype.hasobject
+        and obj.dtype.fields is None
+    )
+
+
+def pack_array(ar):
+    """Pack numpy array into the envelope tuple.
+
+    :param ar: (numpy.ndarray) array to pack
+    :return: (tuple) (ENVELOPE_TAG, dtype_str, shape, raw_bytes)
+    """
+
+    ar = np.ascontiguousarray(ar)
+
+    return ENVELOPE_TAG, ar.dtype.str, tuple(ar.shape), ar.tobytes()
+
+
+def is_envelope(obj):
+    """Check if the object is an array envelope produced by pack_array().
+
+    :param obj: any object
+    :return: (bool)
+    """
+
+    # type() check also guarantees that obj is a local tuple, not a netref
+    return type(obj) is tuple and len(obj) == 4 and obj[0] == ENVELOPE_TAG
+
+
+def unpack_array(envelope, out=None):
+    """Reconstruct numpy array from the envelope tuple.
+
+    :param envelope: (tuple) envelope produced by pack_array()
+    :param out: (numpy.ndarray) [optional] preallocated buffer.
+                If given, the data is copied into out and out is returned.
+                If not given, a new (writable) array is returned.
+
+                Notice: an empty array is returned as is, even if out is given
+                (nothing to copy: typically returned in the case of timeout).
+
+    :return: (numpy.ndarray) received array
+    """
+
+    _, dtype_str, shape, buf = envelope
+
+    ar = np.frombuffer(buf, dtype=np.dtype(dtype_str)).reshape(shape)
+
+    if out is None:
+        # View of the bytes object is read-only: return a writable copy,
+        # the same as unpack_shm_array()
+        return ar.copy()
+
+    return _copy_into(ar, out=out)
+
+
+def _copy_into(ar, out=None):
+
+    if out is None or ar.size == 0:
+        return ar
+
+    if out.shape != ar.shape:
+        raise ValueError(
+            'unpack_array(): shape of the preallocated buffer {0} does not match '
+            'shape of the received array {1}'.format(out.shape, ar.shape)
+        )
+
+    np.copyto(out, ar, casting='same_kind')
+    return out
+
+
+def encode_result(res):
+    """Pack return value into the envelope if it is a numpy array.
+
+    :param res: return value of an exposed method
+    :return: envelope tuple for numeric arrays, unchanged res otherwise
+    """
+
+    if can_pack(res):
+        return pack_array(res)
+    else:
+        return res
+
+
+def decode_result(res, out=None, release_shm=None, stats=None):
+    """Unpack received value if it is an array envelope.
+
+    :param res: received return value of an exposed method
+    :param out: (numpy.ndarray) [optional] preallocated buffer
+    :param release_shm: (callable) [optional] release_shm(segment_name) is
+                        called after the data was read from shared memory
+    :param stats: (CompressionStats) [optional] decompression counters
+    :return: numpy array for envelopes, unchanged res otherwise
+    """
+
+    if is_envelope(res):
+        return unpack_array(res, out=out)
+
+    elif is_z_envelope(res):
+        _, dtype_str, shape, codec, data = res
+        buf = decompress(data=data, codec=codec, stats=stats)
+        return unpack_array((ENVELOPE_TAG, dtype_str, shape, buf), out=out)
+
+    elif is_z_bytes(res):
+        return decompress(data=res[2], codec=res[1], stats=stats)
+
+    elif is_shm_envelope(res):
+        try:
+            return unpack_shm_array(res, out=out)
+        finally:
+            if release_shm is not None:
+                release_shm(res[3])
+
+    # Array passed as is to an in-process client
+    # (type() check does not touch netrefs)
+    elif out is not None and type(res) is np.ndarray:
+        return _copy_into(res, out=out)
+
+    else:
+        return res
+
+
+# Shared-memory fast path
+
+def is_shm_envelope(obj):
+    return type(obj) is tuple and len(obj) == 4 and obj[0] == SHM_ENVELOPE_TAG
+
+
+def unpack_shm_array(envelope, out=None):
+    """Copy array out of the shared memory segment.
+
+    :param envelope: (tuple) envelope produced by ShmPool.pack_array()
+    :param out: (numpy.ndarray) [optional] preallocated buffer
+    :return: (numpy.ndarray) received array
+    """
+
+    _, dtype_str, shape, name = envelope
+
+    shm = _attach_shm(name=name)
+    try:
+        shm_ar = np.ndarray(shape=shape, dtype=np.dtype(dtype_str), buffer=shm.buf)
+
+        if out is None:
+            ar = shm_ar.copy()
+        else:
+            if out.shape != shm_ar.shape:
+                raise ValueError(
+                    'unpack_shm_array(): shape of the preallocated buffer {0} does not match '
+                    'shape of the received array {1}'.format(out.shape, shm_ar.shape)
+                )
+            np.copyto(out, shm_ar, casting='same_kind')
+            ar = out
+
+        # Release reference to shm.buf before closing the segment
+        del shm_ar
+
+    finally:
+        shm.close()
+
+    return ar
+
+
+def _attach_shm(name):
+
+    # Python 3.13+: do not register attached segment with resource tracker
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    shm = shared_memory.SharedMemory(name=name)
+
+    # Older versions register every attached segment with resource tracker,
+    # which would destroy it at client exit, although it is owned by the server
+    # (unless server and client live in the same process and share the tracker)
+    if os.name == 'posix' and name not in _own_segments:
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+    return shm
+
+
+class ShmPool:
+    """Server-side storage of shared memory segments which are waiting
+    to be read out by the clients.
+
+    The segment stays open until the client calls release() (normally sent
+    by ClientBase right after the read-out) or until it expires.
+    """
+
+    def __init__(self, max_age=60):
+        """
+
+        :param max_age: (float) [s] segments, which were not released
+                        within max_age after creation, are destroyed
+        """
+
+        self._max_age = max_age
+
+        # {segment_name: (SharedMemory, creation_time)}
+        self._segments = dict()
+        self._lock = threading.Lock()
+
+    def pack_array(self, ar):
+        """Copy array into a new shared memory segment
+
+        :param ar: (numpy.ndarray) array to send
+        :return: (tuple) (SHM_ENVELOPE_TAG, dtype_str, shape, segment_name)
+        """
+
+        self._free_expired()
+
+        # Zero-size segments are not allowed
+        shm = shared_memory.SharedMemory(create=True, size=max(ar.nbytes, 1))
+
+        shm_ar = np.ndarray(shape=ar.shape, dtype=ar.dtype, buffer=shm.buf)
+        shm_ar[...] = ar
+        del shm_ar
+
+        with self._lock:
+            self._segments[shm.name] = (shm, time.time())
+            _own_segments.add(shm.name)
+
+        return SHM_ENVELOPE_TAG, ar.dtype.str, tuple(ar.shape), shm.name
+
+    def release(self, name):
+        with self._lock:
+            entry = self._segments.pop(name, None)
+
+        if entry is not None:
+            self._destroy(entry[0])
+
+        return 0
+
+    def release_all(self):
+        with self._lock:
+            entries = list(self._segments.values())
+            self._segments.clear()
+
+        for shm, _ in entries:
+            self._destroy(shm)
+
+        return 0
+
+    def _free_expired(self):
+        now = time.time()
+
+        with self._lock:
+            expired = [
+                name for name, (_, t_created) in self._segments.items()
+                if now - t_created > self._max_age
+            ]
+            entries = [self._segments.pop(name) for name in expired]
+
+        for shm, _ in entries:
+            self._destroy(shm)
+
+    @staticmethod
+    def _destroy(shm):
+        _own_segments.discard(shm.name)
+
+        try:
+            shm.close()
+            shm.unlink()
+        except Exception:
+            pass
+
+
+# Compression
+
+def available_codecs():
+    """Names of available codecs in the order of preference (fastest first)
+
+    :return: (tuple of str)
+    """
+
+    codecs = ()
+
+    if lz4_frame is not None:
+        codecs += ('lz4',)
+    if zstandard is not None:
+        codecs += ('zstd',)
+
+    return codecs + ('zlib',)
+
+
+def choose_codec(client_codecs, server_codecs):
+    """First codec of the client preference list which is supported by the server
+
+    :return: (str) codec name or None
+    """
+
+    for codec in client_codecs:
+        if codec in server_codecs:
+            return codec
+
+    return None
+
+
+def compress(data, codec, stats=None):
+
+    start_time = time.perf_counter()
+
+    if codec == 'lz4':
+        res = lz4_frame.compress(data)
+    elif codec == 'zstd':
+        res = zstandard.ZstdCompressor(level=1).compress(data)
+    elif codec == 'zlib':
+        res = zlib.compress(data, 1)
+    else:
+        raise ValueError('compress(): unknown codec {}'.format(codec))
+
+    if stats is not None:
+        stats.add_compressed(
+            raw_size=len(data),
+            compressed_size=len(res),
+            duration=time.perf_counter() - start_time
+        )
+
+    return res
+
+
+def decompress(data, codec, stats=None):
+
+    start_time = time.perf_counter()
+
+    if codec == 'lz4':
+        res = lz4_frame.decompress(data)
+    elif codec == 'zstd':
+        res = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == 'zlib':
+        res = zlib.decompress(data)
+    else:
+        raise ValueError('decompress(): unknown codec {}'.format(codec))
+
+    if stats is not None:
+        stats.add_decompressed(duration=time.perf_counter() - start_time)
+
+    return res
+
+
+def compress_result(res, codec, stats=None):
+    """Compress array or bytes object, if it is large and compresses well.
+
+    :param res: return value of an exposed method
+    :param codec: (str) codec name
+    :param stats: (CompressionStats) [optional] compression counters
+    :return: compressed envelope or None, if res should not be compressed
+    """
+
+    if can_pack(res):
+        if res.nbytes < COMPRESS_MIN_SIZE:
+            return None
+
+        data = compress(
+            memoryview(np.ascontiguousarray(res)).cast('B'),
+            codec=codec,
+            stats=stats
+        )
+
+        if len(data) > COMPRESS_MAX_RATIO * res.nbytes:
+            return None
+
+        return Z_ENVELOPE_TAG, res.dtype.str, tuple(res.shape), codec, data
+
+    elif type(res) is bytes:
+        if len(res) < COMPRESS_MIN_SIZE:
+            return None
+
+        data = compress(res, codec=codec, stats=stats)
+
+        if len(data) > COMPRESS_MAX_RATIO * len(res):
+            return None
+
+        return Z_BYTES_TAG, codec, data
+
+    else:
+        return None
+
+
+def compress_args(args, kwargs, codec, stats=None):
+    """Compress large bytes arguments of a call (e.g. pickled objects)
+
+    :return: (tuple) (args, kwargs, compressed),
+             compressed - True if at least one argument was compressed
+    """
+
+    compressed = False
+    new_args = []
+
+    for arg in args:
+        z_arg = compress_result(arg, codec=codec, stats=stats) if type(arg) is bytes else None
+        if z_arg is None:
+            new_args.append(arg)
+        else:
+            new_args.append(z_arg)
+            compressed = True
+
+    new_kwargs = dict()
+
+    for name, arg in kwargs.items():
+        z_arg = compress_result(arg, codec=codec, stats=stats) if type(arg) is bytes else None
+        if z_arg is None:
+            new_kwargs[name] = arg
+        else:
+            new_kwargs[name] = z_arg
+            compressed = True
+
+    return tuple(new_args), new_kwargs, compressed
+
+
+def decompress_args(args, kwargs, stats=None):
+    """Reverse of compress_args()
+
+    :return: (tuple) (args, kwargs)
+    """
+
+    args = tuple(
+        decompress(arg[2], codec=arg[1], stats=stats) if is_z_bytes(arg) else arg
+        for arg in args
+    )
+
+    kwargs = {
+        name: decompress(arg[2], codec=arg[1], stats=stats) if is_z_bytes(arg) else arg
+        for name, arg in kwargs.items()
+    }
+
+    return args, kwargs
+
+
+def is_z_envelope(obj):
+    return type(obj) is tuple and len(obj) == 5 and obj[0] == Z_ENVELOPE_TAG
+
+
+def is_z_bytes(obj):
+    return type(obj) is tuple and len(obj) == 3 and obj[0] == Z_BYTES_TAG
+
+
+class CompressionStats:
+    """Thread-safe counters of compression ratio and time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._compressed_n = 0
+            self._raw_bytes = 0
+            self._compressed_bytes = 0
+            self._compress_time = 0.0
+            self._decompressed_n = 0
+            self._decompress_time = 0.0
+
+    def add_compressed(self, raw_size, compressed_size, duration):
+        with self._lock:
+            self._compressed_n += 1
+            self._raw_bytes += raw_size
+            self._compressed_bytes += compressed_size
+            self._compress_time += duration
+
+    def add_decompressed(self, duration):
+        with self._lock:
+            self._decompressed_n += 1
+            self._decompress_time += duration
+
+    def as_dict(self):
+        """
+        :return: (dict) counters:
+                 compressed_n - number of compressed payloads,
+                 raw_bytes/compressed_bytes - total size before/after compression,
+                 ratio - raw_bytes/compressed_bytes,
+                 compress_time - total compression time [s],
+                 decompressed_n - number of decompressed payloads,
+                 decompress_time - total decompression time [s]
+        """
+
+        with self._lock:
+            return dict(
+                compressed_n=self._compressed_n,
+                raw_bytes=self._raw_bytes,
+                compressed_bytes=self._compressed_bytes,
+                ratio=self._raw_bytes / self._compressed_bytes if self._compressed_bytes else None,
+                compress_time=self._compress_time,
+                decompressed_n=self._decompressed_n,
+                decompress_time=self._decompress_time
+            )
@@ -1,12 +1,12 @@
-import TimeTagger as TT
 import time
 import copy
-import pickle
 from pylabnet.utils.logging.logger import LogHandler
 from pylabnet.hardware.interface.gated_ctr import CtrError
 from pylabnet.core.service_base import ServiceBase
 from pylabnet.core.client_base import ClientBase
 
+# TimeTagger is imported lazily (see pylabnet.utils.import_check)
+
 
 class Wrap:
 
@@ -62,6 +62,8 @@ class Wrap:
 
     def init_ctr(self, bin_n, bin_w):
 
+        import TimeTagger as TT
+
         bin_w = int(bin_w / 1e-12)
 
         # Close existing counter, if it was initialized before
@@ -200,6 +202,8 @@ class Wrap:
                         }
         """
 
+        import TimeTagger as TT
+
         if click_ch is not None:
             # for convenience bring int type of input to list of int
             if isinstance(click_ch, list):
@@ -265,6 +269,8 @@ class Wrap:
                 Empty list is returned in the case of error.
         """
 
+        import TimeTagger as TT
+
         # Sanity check: check that connection to the device was established
         if self._tagger is None:
             msg_str = 'get_all_chs(): not connected to the device yet'
@@ -279,6 +285,12 @@ class Wrap:
 
 class Service(ServiceBase):
 
+    # Period [s] of pushing the count trace to subscribers
+    # of "count_trace" topic while counting is running
+    stream_period = 0.1
+
+    shared_methods = ('get_count_trace',)
+
     def exposed_activate_interface(self):
         return self._module.activate_interface()
 
@@ -289,17 +301,26 @@ class Service(ServiceBase):
         )
 
     def exposed_close_ctr(self):
+        self.stop_streaming(topic='count_trace')
         return self._module.close_ctr()
 
     def exposed_start_counting(self):
-        return self._module.start_counting()
+        ret_code = self._module.start_counting()
+
+        self.start_streaming(
+            topic='count_trace',
+            get_data=self._module.get_count_trace,
+            period=self.stream_period
+        )
+
+        return ret_code
 
     def exposed_stop_counting(self):
+        self.stop_streaming(topic='count_trace')
         return self._module.stop_counting()
 
     def exposed_get_count_trace(self):
-        res = self._module.get_count_trace()
-        return pickle.dumps(res)
+        return self._module.get_count_trace()
 
 
 class Client(ClientBase):
@@ -322,6 +343,15 @@ class Client(ClientBase):
     def stop_counting(self):
         return self._service.exposed_stop_counting()
 
-    def get_count_trace(self):
-        res_pickle = self._service.exposed_get_count_trace()
-        return pickle.loads(res_pickle)
+    def get_count_trace(self, out=None):
+        """Get count trace
+
+        :param out: (numpy.ndarray) [optional] preallocated buffer
+                    of shape (bin_n,) to receive the data into
+        :return: (numpy.ndarray) count trace
+        """
+
+        if out is None:
+            return self._service.exposed_get_count_trace()
+        else:
+            return self._service.exposed_get_count_trace.into(out)
@@ -1,16 +1,28 @@
-import TimeTagger as TT
 import time
+import threading
 import copy
-import pickle
 import numpy as np
 from pylabnet.utils.logging.logger import LogHandler
 from pylabnet.hardware.interface.gated_ctr import GatedCtrInterface, CtrError
 from pylabnet.core.service_base import ServiceBase
 from pylabnet.core.client_base import ClientBase
 
+# TimeTagger is imported lazily (see pylabnet.utils.import_check)
+
 
 class Wrap(GatedCtrInterface):
 
+    # Completion wait in get_count_ar() [s]:
+    #   first status check interval, doubled after each check
+    min_poll_interval = 50e-6
+    #   max check interval when the expected duration is unknown
+    max_poll_interval = 0.01
+    #   fraction of expected duration: max check interval when it is known
+    poll_fraction = 0.02
+
+    # Time [s] after start of a measurement until it is actually ready to count
+    settle_time = 0.1
+
     def __init__(self, tagger, click_ch, gate_ch, logger=None):
         """Instantiate gated counter
 
@@ -44,6 +56,11 @@ class Wrap(GatedCtrInterface):
         #   the size of allocated memory buffer.
         # must be given as argument of init_ctr() call
         self._bin_number = 0
+        self._gate_type = ''
+        # second measurement instance for the double-buffered stream
+        # (see start_stream()). While streaming, self._ctr is the armed instance
+        # and self._ctr_spare is the one, which was just read out
+        self._ctr_spare = None
 
         # Channel assignments
         self._click_ch = 0
@@ -109,8 +126,8 @@ class Wrap(GatedCtrInterface):
                 'measure bin_number-1 pulses and the last element of the returned '
                 'count_ar is just a copy of the preceding one. \n'
                 'With bin_number={}, only the first {} gate windows will actually be '
-                'measured.'
-                ''.format(bin_number, bin_number - 1)
+                'measured.',
+                bin_number, bin_number - 1
             )
 
         # Close existing counter, if it was initialized before
@@ -119,34 +136,14 @@ class Wrap(GatedCtrInterface):
 
         # Instantiate counter measurement
         try:
-            if gate_type == 'RF':
-                self._ctr = TT.CountBetweenMarkers(
-                    tagger=self._tagger,
-                    click_channel=self._click_ch,
-                    begin_channel=self._gate_ch,
-                    end_channel=-self._gate_ch,
-                    n_values=bin_number - 1
-                )
-            elif gate_type == 'RR':
-                self._ctr = TT.CountBetweenMarkers(
-                    tagger=self._tagger,
-                    click_channel=self._click_ch,
-                    begin_channel=self._gate_ch,
-                    n_values=bin_number - 1
-                )
-            else:
-                msg_str = 'init_ctr(): unknown gate type "{}" \n' \
-                          'Valid types are: \v' \
-                          '     "RR" - Raising-Raising \n' \
-                          '     "RF" - Raising-Falling'
-                self.log.error(msg_str=msg_str)
-                raise CtrError(msg_str)
+            self._ctr = self._make_ctr(bin_number=bin_number, gate_type=gate_type)
 
             # set status to "idle"
             self._set_status(0)
 
-            # save bin_number in internal variable
+            # save bin_number and gate_type in internal variables
             self._bin_number = bin_number
+            self._gate_type = gate_type
 
         # handle NotImplementedError (typical error, produced by TT functions)
         except NotImplementedError:
@@ -169,15 +166,17 @@ class Wrap(GatedCtrInterface):
 
     def close_ctr(self):
 
-        # Try to stop and to clear TT.CountBetweenMarkers measurement instance
-        try:
-            self._ctr.stop()
-            self._ctr.clear()
-        except:
-            pass
+        # Try to stop and to clear TT.CountBetweenMarkers measurement instances
+        for ctr in (self._ctr, self._ctr_spare):
+            try:
+                ctr.stop()
+                ctr.clear()
+            except:
+                pass
 
-        # Remove reference, set status to "void"
+        # Remove references, set status to "void"
         self._ctr = None
+        self._ctr_spare = None
         self._set_status(-1)
 
         return 0
@@ -208,7 +207,7 @@ class Wrap(GatedCtrInterface):
             self._set_status(1)
 
             # Wait until the counter is actually ready to count
-            time.sleep(0.1)
+            time.sleep(self.settle_time)
 
             return 0
 
@@ -253,6 +252,9 @@ class Wrap(GatedCtrInterface):
             raise CtrError(msg_str)
 
     def get_status(self):
+        return copy.deepcopy(self._update_status())
+
+    def _update_status(self):
 
         # Check that counter measurement was initialized and that the connection works
         # by calling isRunning()
@@ -280,61 +282,282 @@ class Wrap(GatedCtrInterface):
                 self._ctr.stop()
                 self._status = 2
 
-        return copy.deepcopy(self._status)
+        return self._status
 
-    def get_count_ar(self, timeout=-1):
+    def get_count_ar(self, timeout=-1, expected_duration=None):
+        """Wait for the measurement to finish and return count array
+
+        :param timeout: (float) timeout [s]. Negative value - wait infinitely
+                        (or, if expected_duration is given, up to
+                        2*expected_duration + 1 s)
+        :param expected_duration: (float) [optional] expected duration [s]
+                                  of the running sequence: status is not checked
+                                  before it elapses, then checked with
+                                  a fine-grained interval
+        :return: (numpy.ndarray) count array. Empty list, if counter is
+                 not "finished" (timeout elapsed or counting was terminated)
+        """
+
+        timeout = wait_timeout(timeout=timeout, expected_duration=expected_duration)
 
         # If current status is "in_progress",
         # wait for transition to some other state:
         #   "finished" if measurement completes successfully,
         #   "idle" if measurement is terminated,
         #   "void" if counter breaks
-        start_time = time.time()
-        sleep_time = abs(timeout)/100
-
-        while self.get_status() == 1:
-            # stop waiting if timeout elapses
-            if time.time()-start_time > timeout >= 0:
-                break
-            time.sleep(sleep_time)
+        self._wait_finished(timeout=timeout, expected_duration=expected_duration)
 
         # Analyze current status and return correspondingly
         status = self.get_status()
 
         # return data only in the case of "finished" state
         if status == 2:
-            count_array = np.array(
-                self._ctr.getData(),
-                dtype=np.uint32
-            )
-
-            # Fix of the issue with an additional gate pulse needed to complete
-            # measurement (see comment in init_ctr() for explanation):
-            #   the last element of returned array is just a copy
-            #   of the last physically measured bin
-            count_array = np.append(count_array, count_array[-1])
-
-            return count_array
+            return self._read_count_ar(self._ctr)
 
         # return empty list for all other states ("in_progress", "idle", and "void")
         else:
-            if status == 1:
-                self.log.warn(
-                    'get_count_ar(): operation timed out, but counter is still running. \n'
-                    'Try calling get_count_ar() later or terminate process by terminate_counting().'
+            self._report_not_finished(method_name='get_count_ar', status=status)
+            return []
+
+    # ------------------------------------------------------
+
+    # Double-buffered stream
+    #
+    #   Two CountBetweenMarkers instances on the same channels alternate:
+    #   as soon as the armed one is finished, the other one is cleared and
+    #   started, and only then the finished one is read out. The settling
+    #   delay of the newly armed buffer (settle_time, the same as in
+    #   start_counting()) overlaps with the readout: get_next_buffer()
+    #   returns once the next buffer is ready to count, and the next
+    #   repetition can be triggered right away.
+    #
+    #   While streaming, the status machine is the same as for start_counting():
+    #   "in_progress" while the armed buffer fills, "finished" - when it is full
+    #   (get_next_buffer() switches back to "in_progress").
+
+    def start_stream(self):
+        """Start double-buffered acquisition (counter must be initialized by init_ctr())
+
+        :return: 0
+        """
+
+        # Sanity check: ensure that counter is not "void"
+        if self.get_status() == -1:
+            msg_str = 'start_stream(): ' \
+                      'counter is in "void" state - it ether was not initialized or was closed. \n' \
+                      'Initialize it by calling init_ctr()'
+            self.log.error(msg_str=msg_str)
+            raise CtrError(msg_str)
+
+        try:
+            if self._ctr_spare is None:
+                self._ctr_spare = self._make_ctr(
+                    bin_number=self._bin_number,
+                    gate_type=self._gate_type
                 )
-            elif status == 0:
-                self.log.warn('get_count_ar(): counter is "idle" - nothing to read')
-            else:
-                msg_str = 'get_count_ar(): counter broke and was deleted \n' \
-                          'Re-initialize it by calling init_ctr()'
-                self.log.error(msg_str=msg_str)
-                raise CtrError(msg_str)
 
+            self._ctr_spare.stop()
+            self._ctr_spare.clear()
+
+        except NotImplementedError:
+            self.close_ctr()
+
+            msg_str = 'start_stream(): instantiation of the second CountBetweenMarkers ' \
+                      'measurement failed. Counter was closed. \n' \
+                      'Re-initialize it by calling init_ctr()'
+            self.log.error(msg_str=msg_str)
+            raise CtrError(msg_str)
+
+        return self.start_counting()
+
+    def get_next_buffer(self, timeout=-1, expected_duration=None):
+        """Wait for the armed buffer to fill, arm the other one and return the data
+
+        :param timeout: (float) timeout [s]. Negative value - wait infinitely
+                        (or up to 2*expected_duration + 1 s, if it is given)
+        :param expected_duration: (float) [optional] expected duration [s]
+                                  of one repetition (see get_count_ar())
+        :return: (numpy.ndarray) count array of the finished buffer.
+                 Empty list, if it is not finished (timeout elapsed
+                 or the stream was stopped)
+        """
+
+        if self._ctr_spare is None:
+            msg_str = 'get_next_buffer(): stream was not started. Call start_stream() first'
+            self.log.error(msg_str=msg_str)
+            raise CtrError(msg_str)
+
+        timeout = wait_timeout(timeout=timeout, expected_duration=expected_duration)
+
+        status = self._wait_finished(timeout=timeout, expected_duration=expected_duration)
+
+        if status != 2:
+            self._report_not_finished(method_name='get_next_buffer', status=status)
             return []
 
+        finished_ctr = self._ctr
+
+        # Arm the other buffer first, then read out the finished one
+        try:
+            self._ctr_spare.clear()
+            self._ctr_spare.start()
+            t_armed = time.perf_counter()
+
+        except NotImplementedError:
+            self.close_ctr()
+
+            msg_str = 'get_next_buffer(): call failed. Counter was closed. \n' \
+                      'Re-initialize counter by calling init_ctr() again'
+            self.log.error(msg_str=msg_str)
+            raise CtrError(msg_str)
+
+        self._ctr, self._ctr_spare = self._ctr_spare, finished_ctr
+        self._set_status(1)
+
+        count_array = self._read_count_ar(finished_ctr)
+
+        # Wait until the armed buffer is actually ready to count
+        # (the rest of settle_time, which was not covered by the readout)
+        remaining = self.settle_time - (time.perf_counter() - t_armed)
+        if remaining > 0:
+            time.sleep(remaining)
+
+        return count_array
+
+    def stop_stream(self):
+        """Stop double-buffered acquisition: the armed buffer is discarded
+
+        :return: 0
+        """
+
+        return self.terminate_counting()
+
     # ------------------------------------------------------
 
+    def _make_ctr(self, bin_number, gate_type):
+        """Instantiate CountBetweenMarkers measurement on the current channels
+
+        (see comment in init_ctr() about n_values = bin_number - 1)
+
+        :return: TT.CountBetweenMarkers instance (running)
+        """
+
+        import TimeTagger as TT
+
+        if gate_type == 'RF':
+            return TT.CountBetweenMarkers(
+                tagger=self._tagger,
+                click_channel=self._click_ch,
+                begin_channel=self._gate_ch,
+                end_channel=-self._gate_ch,
+                n_values=bin_number - 1
+            )
+        elif gate_type == 'RR':
+            return TT.CountBetweenMarkers(
+                tagger=self._tagger,
+                click_channel=self._click_ch,
+                begin_channel=self._gate_ch,
+                n_values=bin_number - 1
+            )
+        else:
+            msg_str = 'init_ctr(): unknown gate type "{}" \n' \
+                      'Valid types are: \v' \
+                      '     "RR" - Raising-Raising \n' \
+                      '     "RF" - Raising-Falling'
+            self.log.error(msg_str=msg_str)
+            raise CtrError(msg_str)
+
+    @staticmethod
+    def _read_count_ar(ctr):
+        count_array = np.array(
+            ctr.getData(),
+            dtype=np.uint32
+        )
+
+        # Fix of the issue with an additional gate pulse needed to complete
+        # measurement (see comment in init_ctr() for explanation):
+        #   the last element of returned array is just a copy
+        #   of the last physically measured bin
+        count_array = np.append(count_array, count_array[-1])
+
+        return count_array
+
+    def _report_not_finished(self, method_name, status):
+        if status == 1:
+            self.log.warn(
+                '{0}(): operation timed out, but counter is still running. \n'
+                'Try calling {0}() later or terminate process by terminate_counting().',
+                method_name
+            )
+        elif status == 0:
+            self.log.warn('{}(): counter is "idle" - nothing to read', method_name)
+        else:
+            msg_str = '{}(): counter broke and was deleted \n' \
+                      'Re-initialize it by calling init_ctr()'.format(method_name)
+            self.log.error(msg_str=msg_str)
+            raise CtrError(msg_str)
+
+    def _wait_finished(self, timeout, expected_duration=None, poll=None):
+        """Wait while counter status is "in_progress"
+
+        Status is checked with exponentially growing interval, starting
+        from min_poll_interval: short sequences are noticed within tens of
+        microseconds and long ones cost only tens of status checks.
+        If expected_duration is given, the first check happens when it
+        is about to elapse, and the interval stays below poll_fraction of it.
+
+        :param timeout: (float) [s] negative - wait infinitely
+        :param expected_duration: (float) [s] [optional]
+        :param poll: (callable) [optional] poll() checks and returns status.
+                     Service passes a version which holds the device lock
+                     only for the check itself, not for the sleeps between checks.
+                     None - self._update_status
+        :return: (int) status at return
+        """
+
+        if poll is None:
+            poll = self._update_status
+
+        start_time = time.perf_counter()
+        deadline = None if timeout < 0 else start_time + timeout
+
+        if expected_duration is None:
+            max_interval = self.max_poll_interval
+        else:
+            max_interval = max(self.min_poll_interval, self.poll_fraction * expected_duration)
+
+            # Nothing to check before the sequence is expected to end
+            # (sleeping in small chunks, to notice terminate_counting())
+            sleep_until = start_time + expected_duration - max_interval
+            if deadline is not None:
+                sleep_until = min(sleep_until, deadline)
+
+            while poll() == 1:
+                remaining = sleep_until - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, 0.5))
+
+        interval = self.min_poll_interval
+
+        while True:
+            status = poll()
+            if status != 1:
+                return status
+
+            now = time.perf_counter()
+
+            # stop waiting if timeout elapses
+            if deadline is not None and now >= deadline:
+                return status
+
+            if deadline is not None:
+                time.sleep(min(interval, deadline - now))
+            else:
+                time.sleep(interval)
+
+            interval = min(2 * interval, max_interval)
+
     def _set_status(self, new_status):
         """Method to set new status in a clean way.
 
@@ -441,6 +664,8 @@ class Wrap(GatedCtrInterface):
                         }
         """
 
+        import TimeTagger as TT
+
         if click_ch is not None:
             # for convenience bring int type of input to list of int
             if isinstance(click_ch, list):
@@ -506,6 +731,8 @@ class Wrap(GatedCtrInterface):
                 Empty list is returned in the case of error.
         """
 
+        import TimeTagger as TT
+
         # Sanity check: check that connection to the device was established
         if self._tagger is None:
             msg_str = 'get_all_chs(): not connected to the device yet'
@@ -518,8 +745,34 @@ class Wrap(GatedCtrInterface):
         return channel_list
 
 
+def wait_timeout(timeout, expected_duration):
+    """Default timeout of the completion wait
+
+    :param timeout: (float) [s] caller timeout. Negative - wait infinitely
+    :param expected_duration: (float) [s] [optional] expected sequence duration
+    :return: (float) [s] timeout: 2*expected_duration + 1 s, if timeout
+             is negative and expected_duration is given
+    """
+
+    if timeout < 0 and expected_duration is not None:
+        return 2 * expected_duration + 1
+
+    return timeout
+
+
 class Service(ServiceBase):
 
+    low_priority_methods = ('get_status',)
+
+    # Status transitions must be seen immediately: coalesce in-flight polls only
+    coalesced_methods = {'get_status': 0}
+
+    # get_count_ar() may wait for the measurement to finish for a long time.
+    # It must not block terminate_counting() from other clients:
+    # the device lock is only held for status checks and for the readout
+    # (see _wait_and_read())
+    unlocked_methods = ('get_count_ar', 'get_next_buffer')
+
     def exposed_activate_interface(self):
         return self._module.activate_interface()
 
@@ -533,17 +786,96 @@ class Service(ServiceBase):
         return self._module.close_ctr()
 
     def exposed_start_counting(self):
-        return self._module.start_counting()
+        ret_code = self._module.start_counting()
+
+        # Push count array to subscribers of "count_ar" topic
+        # as soon as the measurement is finished
+        if self.has_subscribers('count_ar'):
+            threading.Thread(
+                target=self._publish_count_ar,
+                # publishing thread acts on behalf of the caller (lease holder)
+                args=(getattr(self._call_context, 'owner', None),),
+                daemon=True
+            ).start()
+
+        return ret_code
 
     def exposed_terminate_counting(self):
         return self._module.terminate_counting()
 
+    def exposed_start_stream(self):
+        return self._module.start_stream()
+
+    def exposed_get_next_buffer(self, timeout=-1, expected_duration=None):
+        return self._wait_and_read(
+            read=self._module.get_next_buffer,
+            timeout=timeout,
+            expected_duration=expected_duration
+        )
+
+    def exposed_stop_stream(self):
+        return self._module.stop_stream()
+
     def exposed_get_status(self):
         return self._module.get_status()
 
-    def exposed_get_count_ar(self, timeout=-1):
-        res = self._module.get_count_ar(timeout=timeout)
-        return pickle.dumps(res)
+    def exposed_get_count_ar(self, timeout=-1, expected_duration=None):
+        return self._wait_and_read(
+            read=self._module.get_count_ar,
+            timeout=timeout,
+            expected_duration=expected_duration
+        )
+
+    def _wait_and_read(self, read, timeout, expected_duration):
+        """Wait for the measurement without holding the device,
+        then read out (and switch buffers) under the device lock
+
+        :param read: (callable) module method: get_count_ar or get_next_buffer
+        :return: (numpy.ndarray) count array (empty if nothing to read)
+        """
+
+        # Each status check takes the device lock only for the check itself
+        self._module._wait_finished(
+            timeout=wait_timeout(timeout=timeout, expected_duration=expected_duration),
+            expected_duration=expected_duration,
+            poll=self._get_status_polled
+        )
+
+        # Status transition, readout and buffer swap must not interleave
+        # with init_ctr()/start_counting()/close_ctr() of other clients
+        with self.device_access():
+            res = read(timeout=0)
+
+        # Empty list is returned if there is nothing to read:
+        # convert it into empty array, such that it is sent by value
+        return np.asarray(res, dtype=np.uint32)
+
+    def _publish_count_ar(self, owner=None):
+
+        self._call_context.owner = owner
+
+        # Wait until the measurement leaves "in_progress" state
+        # (backoff wait, the device lock is held only for status checks)
+        # and publish the result only if it was successfully "finished"
+        # (nothing is published if counting was terminated)
+        try:
+            self._module._wait_finished(timeout=-1, poll=self._get_status_polled)
+
+            with self.device_access(low_priority=True):
+                if self._module.get_status() == 2:
+                    count_ar = np.asarray(self._module.get_count_ar(), dtype=np.uint32)
+                else:
+                    return
+
+            self.publish(topic='count_ar', data=count_ar)
+
+        except CtrError:
+            # Error was already logged by the module
+            pass
+
+    def _get_status_polled(self):
+        with self.device_access(low_priority=True):
+            return self._module.get_status()
 
 
 class Client(ClientBase, GatedCtrInterface):
@@ -569,6 +901,66 @@ class Client(ClientBase, GatedCtrInterface):
     def get_status(self):
         return self._service.exposed_get_status()
 
-    def get_count_ar(self, timeout=-1):
-        res_pickle = self._service.exposed_get_count_ar(timeout=timeout)
-        return pickle.loads(res_pickle)
+    def get_count_ar(self, timeout=-1, out=None, expected_duration=None):
+        """Get count array
+
+        :param timeout: (float) timeout [s]. Negative value - wait infinitely
+                        (or up to 2*expected_duration + 1 s, if it is given)
+        :param expected_duration: (float) [optional] expected duration [s]
+                                  of the running sequence: sets the default
+                                  timeout and the status check schedule
+        :param out: (numpy.ndarray) [optional] preallocated buffer
+                    of shape (bin_number,) to receive the data into
+        :return: (numpy.ndarray) count array. Empty list, if counter is
+                 not "finished" (timeout elapsed or counting was terminated)
+        """
+
+        if out is None:
+            res = self._service.exposed_get_count_ar(
+                timeout=timeout,
+                expected_duration=expected_duration
+            )
+        else:
+            res = self._service.exposed_get_count_ar.into(
+                out,
+                timeout=timeout,
+                expected_duration=expected_duration
+            )
+
+        # Service sends empty array instead of empty list (to pass it by value)
+        return res if len(res) else []
+
+    def start_stream(self):
+        return self._service.exposed_start_stream()
+
+    def get_next_buffer(self, timeout=-1, out=None, expected_duration=None):
+        """Get count array of the next buffer of the double-buffered stream
+        (the other buffer is already armed when this call returns)
+
+        :param timeout: (float) timeout [s]. Negative value - wait infinitely
+                        (or up to 2*expected_duration + 1 s, if it is given)
+        :param out: (numpy.ndarray) [optional] preallocated buffer
+                    of shape (bin_number,) to receive the data into
+        :param expected_duration: (float) [optional] expected duration [s]
+                                  of one repetition
+        :return: (numpy.ndarray) count array. Empty list, if the buffer
+                 is not finished (timeout elapsed or stream was stopped)
+        """
+
+        if out is None:
+            res = self._service.exposed_get_next_buffer(
+                timeout=timeout,
+                expected_duration=expected_duration
+            )
+        else:
+            res = self._service.exposed_get_next_buffer.into(
+                out,
+                timeout=timeout,
+                expected_duration=expected_duration
+            )
+
+        # Service sends empty array instead of empty list (to pass it by value)
+        return res if len(res) else []
+
+    def stop_stream(self):
+        return self._service.exposed_stop_stream()
@@ -17,6 +17,7 @@ import TimeTagger as TT
 import time
 import copy
 import pickle
+import numpy as np
 
 
 class Wrap:
@@ -334,6 +335,8 @@ class Wrap:
 
 class Service(ServiceBase):
 
+    shared_methods = ('get_counter', 'get_counter_channels')
+
     def exposed_set_up_clock(self, clock_frequency=None, clock_channel=None):
         """
         Sets sample clock frequency for the Counter measurement.
@@ -379,13 +382,25 @@ class Service(ServiceBase):
                                              -1 - Error
         """
 
-        return self._module.set_up_counter(
+        ret_code = self._module.set_up_counter(
             counter_channels=counter_channels,
             sources=sources,
             clock_channel=clock_channel,
             counter_buffer=counter_buffer
         )
 
+        # Push count rate samples to subscribers of "counter" topic
+        # while the counter is running
+        # (get_counter() itself waits for one sample duration)
+        if ret_code == 0:
+            self.start_streaming(
+                topic='counter',
+                get_data=self._get_count_rate,
+                period=0
+            )
+
+        return ret_code
+
     def exposed_close_clock(self):
         """
         Closes the clock.
@@ -404,6 +419,7 @@ class Service(ServiceBase):
                                   -1 - Error
         """
 
+        self.stop_streaming(topic='counter')
         return self._module.close_ctr()
 
     def exposed_get_counter(self, samples=1):
@@ -419,7 +435,10 @@ class Service(ServiceBase):
         """
 
         res = self._module.get_counter(samples=samples)
-        return pickle.dumps(res)
+
+        # Empty list is returned in the case of error:
+        # convert it into empty array, such that it is sent by value
+        return np.asarray(res, dtype=float)
 
     def exposed_get_counter_channels(self):
         """
@@ -430,3 +449,6 @@ class Service(ServiceBase):
 
         res = self._module.get_counter_channels()
         return pickle.dumps(res)
+
+    def _get_count_rate(self):
+        return np.asarray(self._module.get_counter(samples=1), dtype=float)
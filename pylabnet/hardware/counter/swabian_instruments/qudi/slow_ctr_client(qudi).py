@@ -15,6 +15,7 @@ from core.module import Base, ConfigOption
 from interface.slow_counter_interface import SlowCounterInterface, SlowCounterConstraints, CountingMode
 import rpyc
 import pickle
+from pylabnet.core.transport import decode_result
 
 
 class SlowCtrClient(Base, SlowCounterInterface):
@@ -140,8 +141,8 @@ class SlowCtrClient(Base, SlowCounterInterface):
         Empty array [] is returned in the case of error.
         """
 
-        res_pickle = self._service.exposed_get_counter(samples=samples)
-        return pickle.loads(res_pickle)
+        res = self._service.exposed_get_counter(samples=samples)
+        return decode_result(res)
 
     def get_constraints(self):
         """
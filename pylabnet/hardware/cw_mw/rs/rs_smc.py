@@ -1,10 +1,12 @@
-import visa
 from pylabnet.utils.logging.logger import LogHandler
+from pylabnet.utils.getter_cache import cached_getter, invalidates_cache
 from pylabnet.hardware.interface.mw_src import MWSrcInterface, MWSrcError
 from pylabnet.core.service_base import ServiceBase
 from pylabnet.core.client_base import ClientBase
 import pickle
 
+# visa is imported lazily (see pylabnet.utils.import_check)
+
 
 class Driver(MWSrcInterface):
     """Adapted from Qudi <https://github.com/Ulm-IQO/qudi/>
@@ -12,6 +14,8 @@ class Driver(MWSrcInterface):
 
     def __init__(self, addr_str, logger=None):
 
+        import visa
+
         self.log = LogHandler(logger=logger)
 
         # Connect to the device
@@ -37,6 +41,7 @@ class Driver(MWSrcInterface):
         # Error check
         self._er_chk()
 
+    @invalidates_cache
     def reset(self):
         # Reset
         self._cmd_wait('*RST')
@@ -126,6 +131,7 @@ class Driver(MWSrcInterface):
 
         return ret_val
 
+    @invalidates_cache
     def set_freq(self, freq):
 
         if self.get_status() == 1:
@@ -139,6 +145,7 @@ class Driver(MWSrcInterface):
 
         return self.get_freq()
 
+    @invalidates_cache
     def set_freq_swp(self, start, stop, n_pts):
 
         if self.get_status() == 1:
@@ -167,6 +174,7 @@ class Driver(MWSrcInterface):
         self._cmd_wait(':ABOR:SWE')
         return 0
 
+    @cached_getter
     def get_mode(self):
 
         mode_str = self._dev.query(':FREQ:MODE?').strip('\n').lower()
@@ -351,6 +359,19 @@ class Driver(MWSrcInterface):
 
 class Service(ServiceBase):
 
+    # Queries share one VISA session and can not run simultaneously,
+    # but they should not delay measurement commands
+    low_priority_methods = ('get_status', 'get_pwr', 'get_freq', 'get_mode')
+
+    # Each query is a VISA round trip: simultaneous polls of several clients
+    # share one query (set_xxx() calls drop kept results)
+    coalesced_methods = {
+        'get_status': 0.1,
+        'get_pwr': 0.1,
+        'get_freq': 0.1,
+        'get_mode': 0.1
+    }
+
     def exposed_activate_interface(self):
         return self._module.activate_interface()
 
@@ -4,11 +4,13 @@ from pylabnet.hardware.p_gen.ni_hsdio.c_headers import NITypes, NIConst, build_c
 from pylabnet.hardware.interface.p_gen import PGenError
 from pylabnet.core.service_base import ServiceBase
 from pylabnet.core.client_base import ClientBase
-from pulseblock.pb_sample import pb_sample
 from pylabnet.utils.logging.logger import LogHandler
+from pylabnet.utils.getter_cache import cached_getter, invalidates_cache
 import numpy as np
 import copy
 
+# pulseblock is imported lazily (see pylabnet.utils.import_check)
+
 
 class Driver:
     """Driver class for NI PXI 654x HSDIO card
@@ -74,6 +76,7 @@ class Driver:
             ''.format(dev_name_str, serial_str, self._handle)
         )
 
+    @invalidates_cache
     def reset(self):
 
         self.writn_wfm_set = set()
@@ -109,27 +112,29 @@ class Driver:
     # Hardware settings
     # ================================================================
 
+    @cached_getter
     def get_samp_rate(self):
         return self._get_attr_real64(
             NIConst.NIHSDIO_ATTR_SAMPLE_CLOCK_RATE
         )
 
+    @invalidates_cache
     def set_samp_rate(self, samp_rate):
 
         # Sanity check
         if not samp_rate <= self.constraints['samp_rate']['max']:
             self.log.warn(
                 'set_samp_rate({0} MHz): the requested value exceeds hardware constraint max={1} MHz.\n'
-                'The max possible value will be set instead.'
-                ''.format(samp_rate / 1e6, self.constraints['samp_rate']['max'] / 1e6)
+                'The max possible value will be set instead.',
+                samp_rate / 1e6, self.constraints['samp_rate']['max'] / 1e6
             )
             samp_rate = self.constraints['samp_rate']['max']
 
         elif not self.constraints['samp_rate']['min'] <= samp_rate:
             self.log.warn(
                 'set_samp_rate({0} Hz): the requested value is below the hardware constraint min={1} Hz.\n'
-                'The min possible value will be set instead.'
-                ''.format(samp_rate, self.constraints['samp_rate']['min'])
+                'The min possible value will be set instead.',
+                samp_rate, self.constraints['samp_rate']['min']
             )
             samp_rate = self.constraints['samp_rate']['min']
 
@@ -146,11 +151,13 @@ class Driver:
         # Return the actual final sample rate
         return self.get_samp_rate()
 
+    @cached_getter
     def get_active_chs(self):
         return self._get_attr_str(
             NIConst.NIHSDIO_ATTR_DYNAMIC_CHANNELS
         )
 
+    @invalidates_cache
     def set_active_chs(self, chs_str=None):
 
         if chs_str is None:
@@ -168,6 +175,7 @@ class Driver:
 
         return self.get_active_chs()
 
+    @cached_getter
     def get_mode(self):
         """
 
@@ -188,6 +196,7 @@ class Driver:
             self.log.error(msg_str)
             raise PGenError(msg_str)
 
+    @invalidates_cache
     def set_mode(self, mode_string):
         """
 
@@ -218,6 +227,7 @@ class Driver:
         return self.get_mode()
 
     @property
+    @cached_getter
     def constraints(self):
 
         # Total memory size
@@ -240,6 +250,8 @@ class Driver:
 
         return constr_dict
 
+    # Test-changes (and restores) sample rate
+    @invalidates_cache
     def get_status(self):
 
         try:
@@ -301,13 +313,15 @@ class Driver:
 
     def write_wfm(self, pb_obj, len_adj=True):
 
+        from pulseblock.pb_sample import pb_sample
+
         #
         # Sanity checks
         #
 
         # Only data_width=32 write is currently implemented
         # (DLL function niHSDIO_WriteNamedWaveformU32)
-        hrdw_data_width = 8 * self._get_attr_int32(NIConst.NIHSDIO_ATTR_DATA_WIDTH)
+        hrdw_data_width = 8 * self._get_data_width()
         if hrdw_data_width != 32:
             msg_txt = 'write_wfm(): the card you use has data_width = {0} bits. \n' \
                       'The method was written assuming 32-bit width and have to be modified for your card. \n' \
@@ -321,6 +335,9 @@ class Driver:
         # Sample PulseBlock
         #
 
+        # Read constraints once (property returns the cached dict)
+        wfm_len_constr = self.constraints['wfm_len']
+
         # Map user-friendly names onto physical channel numbers
         pb_obj = copy.deepcopy(pb_obj)
         pb_obj.ch_map(map_dict=self.map_dict)
@@ -330,9 +347,9 @@ class Driver:
         samp_dict, n_pts, add_pts = pb_sample(
             pb_obj=pb_obj,
             samp_rate=samp_rate,
-            len_min=self.constraints['wfm_len']['min'],
-            len_max=self.constraints['wfm_len']['max'],
-            len_step=self.constraints['wfm_len']['step'],
+            len_min=wfm_len_constr['min'],
+            len_max=wfm_len_constr['max'],
+            len_step=wfm_len_constr['step'],
             len_adj=len_adj
         )
         wfm_name = pb_obj.name
@@ -340,8 +357,8 @@ class Driver:
 
         self.log.info(
             'write_wfm(): sampled PulseBlock "{}". \n'
-            'Sample array has {} points. {} samples were added to match hardware wfm len step'
-            ''.format(wfm_name, n_pts, add_pts)
+            'Sample array has {} points. {} samples were added to match hardware wfm len step',
+            wfm_name, n_pts, add_pts
         )
 
         #
@@ -553,6 +570,11 @@ class Driver:
     # Wrappers for C DLL helper functions
     # ================================================================
 
+    @cached_getter
+    def _get_data_width(self):
+        # [bytes]
+        return self._get_attr_int32(NIConst.NIHSDIO_ATTR_DATA_WIDTH)
+
     def _er_chk(self, error_code):
         # C:\Program Files\National Instruments\Shared\Errors\English\IVI-errors.txt
 
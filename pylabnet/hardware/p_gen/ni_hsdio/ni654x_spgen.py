@@ -76,6 +76,13 @@ class Wrap(SimplePGenInterface):
 
 class Service(ServiceBase):
 
+    # get_status() changes sample rate to test the card,
+    # so it is exclusive, but goes after measurement commands
+    low_priority_methods = ('get_status',)
+
+    # get_status() costs several DLL calls
+    coalesced_methods = {'get_status': 0.1}
+
     def exposed_activate_interface(self):
         return self._module.activate_interface()
 
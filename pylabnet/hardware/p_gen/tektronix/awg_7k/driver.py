@@ -1,12 +1,9 @@
 from pylabnet.utils.logging.logger import LogHandler
+from pylabnet.utils.getter_cache import cached_getter, invalidates_cache
 from pylabnet.hardware.interface.simple_p_gen import PGenError
-import pulseblock.pulse as po
-from pulseblock.pb_sample import pb_sample
-from pulseblock.pb_zip import pb_zip
 
 import os
 import time
-import visa
 import numpy as np
 from ftplib import FTP
 import copy
@@ -14,6 +11,8 @@ import copy
 from pylabnet.core.service_base import ServiceBase
 from pylabnet.core.client_base import ClientBase
 
+# visa and pulseblock are imported lazily (see pylabnet.utils.import_check)
+
 
 class Driver:
     """ A hardware module for the Tektronix AWG7000 series for generating
@@ -30,6 +29,8 @@ class Driver:
                  visa_timeout=20,
                  logger=None):
 
+        import visa
+
         self.log = LogHandler(logger=logger)
 
         # Declaration of internal variables -----------------------------------
@@ -196,6 +197,7 @@ class Driver:
             # Just re-raise the original exception
             raise exc_obj
 
+    @invalidates_cache
     def reset(self):
         """ Reset the device.
 
@@ -304,6 +306,7 @@ class Driver:
 
     # Hardware settings
 
+    @cached_getter
     def get_mode(self):
         """
         Returns AWG run mode according to the following list:
@@ -325,6 +328,7 @@ class Driver:
             self.log.error(msg_str=msg_str)
             raise PGenError(msg_str)
 
+    @invalidates_cache
     def set_mode(self, mode_str):
         """Change the run mode of the AWG7000 series.
 
@@ -350,6 +354,7 @@ class Driver:
 
         return self.get_mode()
 
+    @cached_getter
     def get_samp_rate(self):
         """ Get the sample rate of the pulse generator hardware
 
@@ -360,6 +365,7 @@ class Driver:
             self.query('SOUR1:FREQ?')
         )
 
+    @invalidates_cache
     def set_samp_rate(self, samp_rate):
         """ Set the sample rate of the pulse generator hardware.
 
@@ -375,6 +381,7 @@ class Driver:
 
         return self.get_samp_rate()
 
+    @cached_getter
     def get_analog_level(self):
         """ Retrieve the analog amplitude and offset of the provided channels.
 
@@ -410,6 +417,7 @@ class Driver:
 
         return level_dict
 
+    @invalidates_cache
     def set_analog_level(self, level_dict):
         """ Set amplitude-pp and/or offset.
 
@@ -488,6 +496,7 @@ class Driver:
 
         return level_dict
 
+    @invalidates_cache
     def set_digital_level(self, level_dict):
         """ Set low/high value of marker channels.
 
@@ -574,6 +583,7 @@ class Driver:
 
         return self.get_digital_level()
 
+    @cached_getter
     def get_interleave(self):
         """ Check whether Interleave is ON or OFF in AWG.
 
@@ -589,6 +599,7 @@ class Driver:
         else:
             return False
 
+    @invalidates_cache
     def set_interleave(self, state):
         """ Turns the interleave of an AWG on or off.
 
@@ -732,6 +743,8 @@ class Driver:
                  filled with default values.
         """
 
+        import pulseblock.pulse as po
+
         pb_obj = copy.deepcopy(pb_obj)
 
         pb_ch_set = set(pb_obj.p_dict.keys()) | set(pb_obj.dflt_dict.keys())
@@ -774,6 +787,8 @@ class Driver:
                      in the cases of errors.
         """
 
+        from pulseblock.pb_sample import pb_sample
+
         # Get waveform length constraints
         wfm_len_constr = self.get_wfm_len_constr(strict_hrdw_seq=strict_hrdw_seq)
 
@@ -812,6 +827,9 @@ class Driver:
             of error.
         """
 
+        from pulseblock.pb_sample import pb_sample
+        from pulseblock.pb_zip import pb_zip
+
         len_constr_dict = self.get_wfm_len_constr(strict_hrdw_seq=True)
         len_min = len_constr_dict['min']
         len_max = len_constr_dict['max']
@@ -1,7 +1,8 @@
-import rpyc
 import numpy as np
 import pickle
 from pylabnet.utils.logging.logger import LogClient
+from pylabnet.core.service_base import ServiceBase
+from pylabnet.core.client_base import ClientBase
 
 
 class RNG:
@@ -81,21 +82,19 @@ class RNG:
             raise exc_obj
 
 
-class RNGService(rpyc.Service):
+class RNGService(ServiceBase):
+
+    shared_methods = (
+        'get_params',
+        'get_value',
+        'get_test_array',
+        'get_test_array_buf',
+        'ret_test_array'
+    )
 
     _module = None
     log = None
 
-    def on_connect(self, conn):
-        # code that runs when a connection is created
-        # (to init the service, if needed)
-        self.log.info('Client connected')
-
-    def on_disconnect(self, conn):
-        # code that runs after the connection has already closed
-        # (to finalize the service, if needed)
-        self.log.info('Client disconnected')
-
     def assign_module(self, module):
         self._module = module
         self.log = module.log
@@ -120,6 +119,11 @@ class RNGService(rpyc.Service):
     def exposed_get_test_array(self):
         return pickle.dumps(self._module.test_array)
 
+    def exposed_get_test_array_buf(self):
+        # Sent as array envelope or through shared memory
+        # (see pylabnet.core.transport)
+        return self._module.get_test_array()
+
     # Many active clients test
     def exposed_build_test_array(self, client_number, size=1000):
         return self._module.build_test_array(
@@ -136,53 +140,7 @@ class RNGService(rpyc.Service):
         return self._module.divide(a=a, b=b)
 
 
-class RNGClient:
-    def __init__(self, host, port):
-
-        # Internal vars to store server info
-        self._host = ''
-        self._port = 0
-
-        # Internal vars to store refs to server
-        self._connection = None
-        self._service = None
-
-        # Connect to server
-        self.connect(host=host, port=port)
-
-    def connect(self, host='place_holder', port=-1):
-
-        # Update server address if new values are given
-        if host != 'place_holder':
-            self._host = host
-        if port != -1:
-            self._port = port
-
-        # Clean-up old connection if it exists
-        if self._connection is not None or self._service is not None:
-            try:
-                self._connection.close()
-            except:
-                pass
-
-            self._connection = None
-            self._service = None
-
-        # Connect to server
-        try:
-            self._connection = rpyc.connect(
-                host=self._host,
-                port=self._port,
-                config={'allow_public_attrs': True}
-            )
-            self._service = self._connection.root
-
-            return 0
-
-        except Exception as exc_obj:
-            self._connection = None
-            self._service = None
-            raise exc_obj
+class RNGClient(ClientBase):
 
     # Interface methods
 
@@ -211,6 +169,9 @@ class RNGClient:
         pickled_ret_ar = self._service.exposed_get_test_array()
         return pickle.loads(pickled_ret_ar)
 
+    def get_test_array_buf(self, out=None):
+        return self._service.exposed_get_test_array_buf.into(out)
+
     # Many active clients test
     def build_test_array(self, client_number, size=1000):
         return self._service.exposed_build_test_array(
@@ -0,0 +1,134 @@
+""" Read-through cache for driver getters.
+
+Drivers query the same rarely-changing device state over and over
+(sample rate, run mode, memory size), each time paying a VISA/DLL round trip.
+Getters decorated with cached_getter() query the device only once and then
+return the stored value, until a method decorated with invalidates_cache()
+(setters, reset()) is called:
+
+    class Driver:
+
+        @cached_getter
+        def get_samp_rate(self):
+            return float(self.query('SOUR1:FREQ?'))
+
+        @invalidates_cache
+        def set_samp_rate(self, samp_rate):
+            self.write('SOUR1:FREQ {} Hz'.format(samp_rate))
+            return self.get_samp_rate()
+
+    driver.get_samp_rate()            # queries the device
+    driver.get_samp_rate()            # cached value
+    driver.get_samp_rate(fresh=True)  # queries the device
+
+While an invalidating method runs, getters always query the device
+and nothing is stored (such that the setter reads back the new value).
+
+Getters return a copy of the cached value (e.g. nested dicts of
+get_analog_level()): callers, including remote ones, cannot corrupt the cache.
+State changed bypassing the driver (front panel, raw write() commands)
+is not noticed: use fresh=True or invalidate_cache(driver).
+"""
+
+import copy
+import functools
+import threading
+
+
+class _GetterCache:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        # {(getter_name, args, kwargs_items): value}
+        self.values = dict()
+
+        # Number of invalidating methods currently running
+        self.busy = 0
+
+        # Incremented by every invalidation
+        self.generation = 0
+
+
+def _get_cache(obj):
+    # setdefault() is atomic: concurrent first calls get the same cache
+    return obj.__dict__.setdefault('_getter_cache', _GetterCache())
+
+
+def cached_getter(func):
+    """Decorator: cache the return value of the getter.
+
+    The decorated getter accepts additional keyword argument fresh:
+    fresh=True forces the device query (and updates the cache).
+    Calls with different arguments are cached separately.
+    """
+
+    name = func.__name__
+
+    @functools.wraps(func)
+    def getter(self, *args, fresh=False, **kwargs):
+        cache = _get_cache(self)
+
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable arguments: never cached
+            return func(self, *args, **kwargs)
+
+        with cache.lock:
+            if not fresh and cache.busy == 0 and key in cache.values:
+                return copy.deepcopy(cache.values[key])
+
+            generation = cache.generation
+
+        value = func(self, *args, **kwargs)
+
+        with cache.lock:
+            # Do not store the value if the state could change meanwhile
+            if cache.busy == 0 and cache.generation == generation:
+                cache.values[key] = copy.deepcopy(value)
+
+        return value
+
+    return getter
+
+
+def invalidates_cache(func):
+    """Decorator: the method changes device state - drop all cached getter values"""
+
+    @functools.wraps(func)
+    def method(self, *args, **kwargs):
+        cache = _get_cache(self)
+
+        with cache.lock:
+            cache.busy += 1
+            cache.generation += 1
+            cache.values.clear()
+
+        try:
+            return func(self, *args, **kwargs)
+
+        finally:
+            with cache.lock:
+                cache.busy -= 1
+                cache.generation += 1
+                cache.values.clear()
+
+    return method
+
+
+def invalidate_cache(obj):
+    """Drop all cached getter values of the driver instance
+
+    :param obj: driver instance
+    :return: 0
+    """
+
+    cache = _get_cache(obj)
+
+    with cache.lock:
+        cache.generation += 1
+        cache.values.clear()
+
+    return 0
@@ -0,0 +1,122 @@
+""" Import-time budget check for client modules.
+
+Client classes live in the same modules as their drivers. Importing a module
+to get its Client must not import vendor libraries (TimeTagger, visa,
+pulseblock): client machines often have no vendor SDKs installed.
+Driver modules therefore import vendor libraries lazily, inside the driver
+methods which use them (usually __init__()), never at module level:
+
+    class Driver:
+
+        def __init__(self, addr_str):
+            import visa
+
+            self._rm = visa.ResourceManager()
+
+A module-level import would also make every client pay the SDK import time.
+
+Each module is imported in a fresh interpreter. The check fails if the
+import takes longer than the budget or if any vendor library is loaded.
+
+Usage:
+    python import_check.py [budget_s]
+"""
+
+import sys
+import json
+import subprocess
+
+
+CLIENT_MODULES = (
+    'pylabnet.hardware.counter.swabian_instruments.gated_ctr',
+    'pylabnet.hardware.counter.swabian_instruments.cnt_trace',
+    'pylabnet.hardware.cw_mw.rs.rs_smc',
+    'pylabnet.hardware.p_gen.ni_hsdio.ni654x',
+    'pylabnet.hardware.p_gen.ni_hsdio.ni654x_spgen',
+    'pylabnet.hardware.p_gen.tektronix.awg_7k.driver',
+    'pylabnet.hardware.rng',
+    'pylabnet.hardware.interface.gated_ctr',
+    'pylabnet.hardware.interface.mw_src',
+    'pylabnet.hardware.interface.p_gen',
+    'pylabnet.hardware.interface.simple_p_gen'
+)
+
+VENDOR_MODULES = ('TimeTagger', 'visa', 'pyvisa', 'pulseblock')
+
+# Default import-time budget [s] per module (including pylabnet.core and rpyc)
+IMPORT_BUDGET = 1.0
+
+_PROBE = """
+import sys, time, json
+t_start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - t_start
+vendor_list = [name for name in {vendor_modules!r} if name in sys.modules]
+print(json.dumps(dict(duration=duration, vendor=vendor_list)))
+"""
+
+
+def check_imports(modules=CLIENT_MODULES, budget=IMPORT_BUDGET):
+    """Import each module in a fresh interpreter and check the budget
+
+    :param modules: (tuple of str) module names
+    :param budget: (float) [s] max import time per module
+    :return: (list of dict) one dict per module: module, duration [s]
+             (None if import failed), vendor (list of loaded vendor modules),
+             error (str or None), ok (bool)
+    """
+
+    res_list = []
+
+    for module in modules:
+        proc = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module, vendor_modules=VENDOR_MODULES)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+
+        if proc.returncode != 0:
+            res_list.append(dict(
+                module=module,
+                duration=None,
+                vendor=[],
+                error=proc.stderr.strip().split('\n')[-1],
+                ok=False
+            ))
+            continue
+
+        probe_dict = json.loads(proc.stdout.strip().split('\n')[-1])
+
+        res_list.append(dict(
+            module=module,
+            duration=probe_dict['duration'],
+            vendor=probe_dict['vendor'],
+            error=None,
+            ok=probe_dict['duration'] <= budget and not probe_dict['vendor']
+        ))
+
+    return res_list
+
+
+def _format_line(res_dict):
+    if res_dict['error'] is not None:
+        return 'FAIL  {0}: {1}'.format(res_dict['module'], res_dict['error'])
+
+    return '{0}  {1}: {2:.3f} s{3}'.format(
+        'ok  ' if res_dict['ok'] else 'FAIL',
+        res_dict['module'],
+        res_dict['duration'],
+        '' if not res_dict['vendor'] else ', vendor modules: {}'.format(res_dict['vendor'])
+    )
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else IMPORT_BUDGET
+
+    res_list = check_imports(budget=budget)
+
+    for res_dict in res_list:
+        print(_format_line(res_dict))
+
+    sys.exit(0 if all(res_dict['ok'] for res_dict in res_list) else 1)
@@ -0,0 +1,251 @@
+""" Connectionless log transport: UDP or local Unix datagram socket.
+
+Records are sent fire-and-forget: no request/response round trip per record,
+a record which does not reach the log server is just lost. One datagram
+carries one or several records in a compact binary encoding:
+
+    datagram = VERSION (1 byte) + record + record + ...
+    record   = header + tag bytes + message bytes (UTF-8)
+    header   = struct '<dBHI': timestamp (float64), level code (uint8),
+               tag length (uint16), message length (uint32)
+
+Level code is the index of the level name in LEVEL_NAMES.
+"""
+
+import os
+import socket
+import struct
+import threading
+
+
+VERSION = b'\x01'
+
+LEVEL_NAMES = ('DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL')
+_LEVEL_CODES = {level_str: code for code, level_str in enumerate(LEVEL_NAMES)}
+
+_HEADER = struct.Struct('<dBHI')
+
+# Max payload of one datagram [bytes] (below UDP limit of 65507)
+MAX_DATAGRAM = 60000
+
+# Longer messages are truncated to fit into one datagram
+MAX_MSG_LEN = MAX_DATAGRAM - len(VERSION) - _HEADER.size - 1024
+
+
+def unix_available():
+    return hasattr(socket, 'AF_UNIX')
+
+
+def encode_record(record):
+    """Encode one record
+
+    :param record: (tuple) (timestamp, level_str, module_tag, msg_str)
+    :return: (bytes) encoded record (without VERSION prefix)
+    """
+
+    timestamp, level_str, module_tag, msg_str = record
+
+    tag_bytes = str(module_tag).encode('utf-8')[:1024]
+    msg_bytes = str(msg_str).encode('utf-8')[:MAX_MSG_LEN]
+
+    return _HEADER.pack(
+        timestamp,
+        _LEVEL_CODES.get(level_str, _LEVEL_CODES['INFO']),
+        len(tag_bytes),
+        len(msg_bytes)
+    ) + tag_bytes + msg_bytes
+
+
+def pack_datagrams(records):
+    """Encode records and pack them into as few datagrams as possible
+
+    :param records: (iterable) of records (timestamp, level_str, module_tag, msg_str)
+    :return: (list of bytes) datagrams
+    """
+
+    datagram_list = []
+    chunk_list = []
+    chunk_size = len(VERSION)
+
+    for record in records:
+        encoded = encode_record(record)
+
+        if chunk_list and chunk_size + len(encoded) > MAX_DATAGRAM:
+            datagram_list.append(VERSION + b''.join(chunk_list))
+            chunk_list = []
+            chunk_size = len(VERSION)
+
+        chunk_list.append(encoded)
+        chunk_size += len(encoded)
+
+    if chunk_list:
+        datagram_list.append(VERSION + b''.join(chunk_list))
+
+    return datagram_list
+
+
+def unpack_datagram(datagram):
+    """Decode all records of the datagram
+
+    :param datagram: (bytes) received datagram
+    :return: (list) records (timestamp, level_str, module_tag, msg_str).
+             Malformed datagram (or its malformed tail) is ignored
+    """
+
+    if datagram[:len(VERSION)] != VERSION:
+        return []
+
+    record_list = []
+    offset = len(VERSION)
+
+    while offset + _HEADER.size <= len(datagram):
+        timestamp, level_code, tag_len, msg_len = _HEADER.unpack_from(datagram, offset)
+        offset += _HEADER.size
+
+        if offset + tag_len + msg_len > len(datagram) or level_code >= len(LEVEL_NAMES):
+            break
+
+        module_tag = datagram[offset:offset + tag_len].decode('utf-8', errors='replace')
+        offset += tag_len
+        msg_str = datagram[offset:offset + msg_len].decode('utf-8', errors='replace')
+        offset += msg_len
+
+        record_list.append((timestamp, LEVEL_NAMES[level_code], module_tag, msg_str))
+
+    return record_list
+
+
+class DatagramSender:
+    """Client side: send records without waiting for anything"""
+
+    def __init__(self, transport, host=None, port=None, path=None):
+        """
+
+        :param transport: (str) 'udp' or 'unix'
+        :param host: (str) [udp] log server host
+        :param port: (int) [udp] log server port
+        :param path: (str) [unix] socket path of the log server
+        """
+
+        if transport == 'udp':
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._addr = (host, port)
+
+        elif transport == 'unix':
+            if not unix_available():
+                raise ValueError('Unix datagram sockets are not available on this platform')
+
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._addr = path
+
+        else:
+            raise ValueError('Unknown log transport "{}"'.format(transport))
+
+        # Never block the caller: datagram is dropped if the buffer is full
+        self._sock.setblocking(False)
+
+    def send(self, records):
+        """
+        :param records: (iterable) of records
+        :return: (int) number of records which could not be sent
+        """
+
+        records = list(records)
+        lost = 0
+
+        for datagram in pack_datagrams(records):
+            try:
+                self._sock.sendto(datagram, self._addr)
+            except OSError:
+                # Buffer is full or nobody listens (unix): record is lost
+                lost += len(unpack_datagram(datagram))
+
+        return lost
+
+    def close(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class DatagramReceiver:
+    """Server side: receive datagrams in a background thread
+    and pass decoded records to on_records(records)
+    """
+
+    def __init__(self, on_records, transport, host='localhost', port=None, path=None, rcv_buf=2**22):
+        """
+
+        :param on_records: (callable) on_records(list of records)
+        :param transport: (str) 'udp' or 'unix'
+        :param host: (str) [udp] address to bind
+        :param port: (int) [udp] port to bind
+        :param path: (str) [unix] socket path to bind
+        :param rcv_buf: (int) [bytes] socket receive buffer size:
+                        absorbs bursts while records are being stored
+        """
+
+        self._on_records = on_records
+        self._path = path if transport == 'unix' else None
+
+        if transport == 'udp':
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            addr = (host, port)
+
+        elif transport == 'unix':
+            if not unix_available():
+                raise ValueError('Unix datagram sockets are not available on this platform')
+
+            # Stale socket file of a previous (crashed) server
+            if os.path.exists(path):
+                os.remove(path)
+
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            addr = path
+
+        else:
+            raise ValueError('Unknown log transport "{}"'.format(transport))
+
+        try:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcv_buf)
+        except OSError:
+            pass
+
+        self._sock.bind(addr)
+        self._sock.settimeout(0.5)
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._sock.close()
+
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+
+        return 0
+
+    def _receive_loop(self):
+
+        while not self._stop_event.is_set():
+            try:
+                datagram = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            record_list = unpack_datagram(datagram)
+
+            if record_list:
+                try:
+                    self._on_records(record_list)
+                except Exception:
+                    pass
@@ -0,0 +1,223 @@
+""" In-memory ring buffer of recent records for live log viewers.
+
+LogService appends every record to the buffer; any number of viewers
+read from it, each with its own cursor and filter:
+
+    viewer_id = buffer.subscribe(min_level='WARN', tags=('ctr',))
+    records = buffer.read(viewer_id, max_records=500, timeout=1.0)
+
+Appending is O(1) and does not depend on the viewers: filtering and
+batching happen in read(), in the viewer's own thread. The buffer is an
+indexable ring: read() copies at most max_records records at a time under
+the lock (producers never wait for a full scan). A viewer which lags
+behind by more than the buffer size (its unread records were overwritten)
+is dropped: read() raises ViewerDropped and the viewer has to subscribe
+again. Viewers which do not read for viewer_timeout are forgotten.
+"""
+
+import time
+import itertools
+import threading
+
+from pylabnet.utils.logging.log_storage import LEVELS
+
+
+class ViewerDropped(KeyError):
+    """Viewer is unknown: it lagged behind the buffer or was idle for too long"""
+    pass
+
+
+class _Viewer:
+
+    def __init__(self, cursor, level_set, tag_set):
+        # Sequence number of the next record to read
+        self.cursor = cursor
+        self.level_set = level_set
+        self.tag_set = tag_set
+        self.last_read = time.monotonic()
+
+
+class LogBuffer:
+
+    def __init__(self, size=10000, viewer_timeout=60):
+        """
+
+        :param size: (int) number of recent records kept in memory
+        :param viewer_timeout: (float) [s] viewer which does not read
+                               for this time is unsubscribed
+        """
+
+        # Record with sequence number seq is stored at _ring[seq % size]
+        self._ring = [None] * size
+        self._size = size
+        self._viewer_timeout = viewer_timeout
+
+        # Sequence number of the next appended record
+        self._next_seq = 0
+
+        self._cond = threading.Condition()
+
+        # {viewer_id: _Viewer}
+        self._viewers = dict()
+        self._viewer_ids = itertools.count(1)
+
+    def append(self, records):
+        """
+        :param records: (iterable) of records (timestamp, level_str, module_tag, msg_str)
+        :return: 0
+        """
+
+        with self._cond:
+            for record in records:
+                self._ring[self._next_seq % self._size] = record
+                self._next_seq += 1
+
+            # Wakes up only viewers blocked in read()
+            self._cond.notify_all()
+
+        return 0
+
+    def subscribe(self, min_level=None, tags=None, backlog=0):
+        """Register a new viewer
+
+        :param min_level: (str) [optional] min level, e.g. 'WARN'
+        :param tags: (str or tuple of str) [optional] module tag(s)
+        :param backlog: (int) number of already buffered records
+                        to start from (the last ones). 0 - only new records
+        :return: (int) viewer id
+        """
+
+        level_set = None
+        if min_level is not None:
+            level_set = {
+                level_str for level_str, level in LEVELS.items()
+                if level >= LEVELS[min_level]
+            }
+
+        if isinstance(tags, str):
+            tags = (tags,)
+        tag_set = None if tags is None else set(tags)
+
+        with self._cond:
+            self._forget_idle()
+
+            viewer_id = next(self._viewer_ids)
+            self._viewers[viewer_id] = _Viewer(
+                cursor=self._next_seq - min(backlog, self._count()),
+                level_set=level_set,
+                tag_set=tag_set
+            )
+
+        return viewer_id
+
+    def unsubscribe(self, viewer_id):
+        with self._cond:
+            self._viewers.pop(viewer_id, None)
+
+        return 0
+
+    def read(self, viewer_id, max_records=500, timeout=1.0):
+        """Read the next batch of records matching the viewer filter
+
+        Blocks until at least one matching record is available
+        or timeout elapses.
+
+        :param viewer_id: (int) id returned by subscribe()
+        :param max_records: (int) max number of records in the batch
+        :param timeout: (float) [s] max waiting time. 0 - do not wait
+        :return: (list) records (timestamp, level_str, module_tag, msg_str)
+        :raises ViewerDropped: viewer lagged behind the buffer
+                               (or was unsubscribed)
+        """
+
+        deadline = time.monotonic() + timeout
+        res_list = []
+
+        while True:
+            with self._cond:
+                viewer = self._get_viewer(viewer_id)
+                viewer.last_read = time.monotonic()
+
+                if viewer.cursor < self._next_seq - self._count():
+                    # Unread records were overwritten
+                    del self._viewers[viewer_id]
+                    raise ViewerDropped(
+                        'Log viewer {} was dropped: it lagged behind by more than {} records'
+                        ''.format(viewer_id, self._size)
+                    )
+
+                if viewer.cursor == self._next_seq:
+                    remaining = deadline - time.monotonic()
+
+                    if res_list or remaining <= 0:
+                        return res_list
+
+                    self._cond.wait(remaining)
+                    continue
+
+                # Copy of the next max_records unread records
+                # (lock is held only for the copy, filtering is done without it)
+                cursor = viewer.cursor
+                chunk = self._copy_range(cursor, min(self._next_seq, cursor + max_records))
+
+            consumed = 0
+            for record in chunk:
+                consumed += 1
+
+                if viewer.level_set is not None and record[1] not in viewer.level_set:
+                    continue
+                if viewer.tag_set is not None and record[2] not in viewer.tag_set:
+                    continue
+
+                res_list.append(record)
+
+                if len(res_list) >= max_records:
+                    break
+
+            with self._cond:
+                viewer.cursor = cursor + consumed
+
+            if len(res_list) >= max_records:
+                return res_list
+
+    def get_viewers(self):
+        """
+        :return: (dict) {viewer_id: lag}, lag - number of unread records
+        """
+
+        with self._cond:
+            self._forget_idle()
+
+            return {
+                viewer_id: self._next_seq - viewer.cursor
+                for viewer_id, viewer in self._viewers.items()
+            }
+
+    # Technical methods
+
+    def _count(self):
+        # Number of records currently in the buffer
+        return min(self._next_seq, self._size)
+
+    def _copy_range(self, start, stop):
+        # Records with sequence numbers start <= seq < stop (at most size of them)
+        start_idx = start % self._size
+        stop_idx = start_idx + (stop - start)
+
+        if stop_idx <= self._size:
+            return self._ring[start_idx:stop_idx]
+        else:
+            return self._ring[start_idx:] + self._ring[:stop_idx - self._size]
+
+    def _get_viewer(self, viewer_id):
+        try:
+            return self._viewers[viewer_id]
+        except KeyError:
+            raise ViewerDropped('Unknown log viewer {}'.format(viewer_id))
+
+    def _forget_idle(self):
+        now = time.monotonic()
+
+        for viewer_id, viewer in list(self._viewers.items()):
+            if now - viewer.last_read > self._viewer_timeout:
+                del self._viewers[viewer_id]
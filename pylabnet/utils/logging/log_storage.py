@@ -0,0 +1,355 @@
+""" Persistent log storage for LogService.
+
+Records are appended to segment files in the storage directory:
+
+    segment_00000001.log, segment_00000002.log, ...
+
+one record per line, as a JSON list [timestamp, level_str, module_tag, msg_str].
+When the active segment exceeds segment_size, it is closed and a new one
+is started (optionally, the oldest segments beyond max_segments are deleted).
+
+Each closed segment has a compact index next to it (segment_xxx.idx, JSON):
+
+    - time range, set of module tags and set of levels of the segment;
+    - time range and file offset of each block of block_size records.
+
+query() uses the index to skip whole segments (time range, tag, level)
+and, within a segment, to read only the blocks overlapping the time range.
+Index of the active segment is kept in memory (and is rebuilt by scanning
+the segment on restart).
+"""
+
+import os
+import re
+import json
+import threading
+
+
+# Numeric values of log levels (the same as LogClient levels)
+LEVELS = dict(
+    DEBUG=10,
+    INFO=20,
+    WARN=30,
+    ERROR=40,
+    CRITICAL=50
+)
+
+_SEGMENT_RE = re.compile(r'^segment_(\d{8})\.log$')
+
+
+class LogStorage:
+
+    def __init__(self, dir_path, segment_size=2**26, max_segments=None, block_size=256):
+        """
+
+        :param dir_path: (str) storage directory (created if it does not exist)
+        :param segment_size: (int) [bytes] size of the segment file, after which
+                             a new segment is started
+        :param max_segments: (int) [optional] max number of kept segments:
+                             the oldest ones are deleted.
+                             None - keep everything
+        :param block_size: (int) number of records per index block
+        """
+
+        self._dir_path = dir_path
+        self._segment_size = segment_size
+        self._max_segments = max_segments
+        self._block_size = block_size
+
+        self._lock = threading.Lock()
+
+        # Index dicts of all segments, the last one is active
+        self._segments = []
+        # File object of the active segment (opened for appending).
+        # None after close()
+        self._file = None
+
+        os.makedirs(dir_path, exist_ok=True)
+        self._load()
+
+    # Writing
+
+    def append(self, records):
+        """Append records to the storage
+
+        :param records: (iterable) of records (timestamp, level_str, module_tag, msg_str)
+        :return: 0
+        """
+
+        with self._lock:
+            self._check_open()
+
+            for record in records:
+                self._write(record)
+
+            self._file.flush()
+
+            if self._segments[-1]['size'] >= self._segment_size:
+                self._rotate()
+
+        return 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._save_index(self._segments[-1])
+
+        return 0
+
+    # Reading
+
+    def query(self, t_start=None, t_stop=None, tags=None, min_level=None, substring=None, limit=1000):
+        """Find records matching all given conditions
+
+        :param t_start: (float) [optional] min timestamp
+        :param t_stop: (float) [optional] max timestamp
+        :param tags: (str or tuple of str) [optional] module tag(s)
+        :param min_level: (str) [optional] min level, e.g. 'WARN'
+        :param substring: (str) [optional] message substring
+        :param limit: (int) max number of returned records. None - no limit
+        :return: (list) records (timestamp, level_str, module_tag, msg_str)
+                 in the order of arrival
+        """
+
+        if isinstance(tags, str):
+            tags = (tags,)
+        tag_set = None if tags is None else set(tags)
+
+        level_set = None
+        if min_level is not None:
+            level_set = {
+                level_str for level_str, level in LEVELS.items()
+                if level >= LEVELS[min_level]
+            }
+
+        with self._lock:
+            self._check_open()
+
+            # Snapshot of the index: appended data beyond recorded sizes
+            # is not visible to this query
+            self._file.flush()
+            segment_list = [
+                dict(segment, blocks=list(segment['blocks']), tags=set(segment['tags']), levels=set(segment['levels']))
+                for segment in self._segments
+            ]
+
+        res_list = []
+
+        for segment in segment_list:
+            if not _overlaps(segment['t_min'], segment['t_max'], t_start, t_stop):
+                continue
+            if tag_set is not None and not tag_set & segment['tags']:
+                continue
+            if level_set is not None and not level_set & segment['levels']:
+                continue
+
+            for record in self._read_segment(segment, t_start, t_stop):
+                timestamp, level_str, module_tag, msg_str = record
+
+                if t_start is not None and timestamp < t_start:
+                    continue
+                if t_stop is not None and timestamp > t_stop:
+                    continue
+                if tag_set is not None and module_tag not in tag_set:
+                    continue
+                if level_set is not None and level_str not in level_set:
+                    continue
+                if substring is not None and substring not in msg_str:
+                    continue
+
+                res_list.append(record)
+
+                if limit is not None and len(res_list) >= limit:
+                    return res_list
+
+        return res_list
+
+    def get_segments(self):
+        """
+        :return: (list of dict) summary of each segment: name, size [bytes],
+                 count, t_min, t_max, tags, levels
+        """
+
+        with self._lock:
+            return [
+                dict(
+                    name=os.path.basename(segment['path']),
+                    size=segment['size'],
+                    count=segment['count'],
+                    t_min=segment['t_min'],
+                    t_max=segment['t_max'],
+                    tags=sorted(segment['tags']),
+                    levels=sorted(segment['levels'])
+                )
+                for segment in self._segments
+            ]
+
+    # Technical methods
+
+    def _check_open(self):
+        if self._file is None:
+            raise ValueError('LogStorage is closed')
+
+    def _load(self):
+
+        number_list = sorted(
+            int(match.group(1))
+            for match in (_SEGMENT_RE.match(name) for name in os.listdir(self._dir_path))
+            if match is not None
+        )
+
+        for number in number_list:
+            path = self._segment_path(number)
+            segment = self._load_index(path)
+
+            # Active segment (or segment without index) is re-indexed
+            if segment is None or number == number_list[-1]:
+                segment = self._scan(number, path)
+
+            self._segments.append(segment)
+
+        if self._segments:
+            self._file = open(self._segments[-1]['path'], 'ab')
+        else:
+            self._start_segment(number=1)
+
+    def _write(self, record):
+        timestamp, level_str, module_tag, msg_str = record
+
+        line = (json.dumps([timestamp, level_str, module_tag, msg_str]) + '\n').encode('utf-8')
+
+        segment = self._segments[-1]
+        _add_to_index(segment, record, offset=segment['size'], block_size=self._block_size)
+        segment['size'] += len(line)
+
+        self._file.write(line)
+
+    def _rotate(self):
+        self._file.close()
+        self._save_index(self._segments[-1])
+
+        self._start_segment(number=self._segments[-1]['number'] + 1)
+
+        # Retention
+        if self._max_segments is not None:
+            while len(self._segments) > self._max_segments:
+                old_segment = self._segments.pop(0)
+                for path in (old_segment['path'], _index_path(old_segment['path'])):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def _start_segment(self, number):
+        path = self._segment_path(number)
+
+        self._segments.append(_new_index(number, path))
+        self._file = open(path, 'ab')
+
+    def _segment_path(self, number):
+        return os.path.join(self._dir_path, 'segment_{:08d}.log'.format(number))
+
+    def _scan(self, number, path):
+        segment = _new_index(number, path)
+
+        with open(path, 'rb') as segment_file:
+            for line in segment_file:
+                try:
+                    record = tuple(json.loads(line.decode('utf-8')))
+                except ValueError:
+                    # Partially written line (e.g. after a crash)
+                    segment['size'] += len(line)
+                    continue
+
+                _add_to_index(segment, record, offset=segment['size'], block_size=self._block_size)
+                segment['size'] += len(line)
+
+        return segment
+
+    def _read_segment(self, segment, t_start, t_stop):
+        blocks = segment['blocks']
+
+        with open(segment['path'], 'rb') as segment_file:
+            for idx, (offset, t_min, t_max, _) in enumerate(blocks):
+                if not _overlaps(t_min, t_max, t_start, t_stop):
+                    continue
+
+                end = blocks[idx + 1][0] if idx + 1 < len(blocks) else segment['size']
+
+                segment_file.seek(offset)
+                for line in segment_file.read(end - offset).splitlines():
+                    try:
+                        yield tuple(json.loads(line.decode('utf-8')))
+                    except ValueError:
+                        continue
+
+    @staticmethod
+    def _save_index(segment):
+        index_dict = dict(segment, tags=sorted(segment['tags']), levels=sorted(segment['levels']))
+        del index_dict['path']
+
+        with open(_index_path(segment['path']), 'w') as index_file:
+            json.dump(index_dict, index_file)
+
+    @staticmethod
+    def _load_index(path):
+        try:
+            with open(_index_path(path)) as index_file:
+                index_dict = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+
+        index_dict['path'] = path
+        index_dict['tags'] = set(index_dict['tags'])
+        index_dict['levels'] = set(index_dict['levels'])
+
+        return index_dict
+
+
+def _new_index(number, path):
+    return dict(
+        number=number,
+        path=path,
+        size=0,
+        count=0,
+        t_min=None,
+        t_max=None,
+        tags=set(),
+        levels=set(),
+        # [offset, t_min, t_max, count] per block
+        blocks=[]
+    )
+
+
+def _add_to_index(segment, record, offset, block_size):
+    timestamp, level_str, module_tag, _ = record
+
+    blocks = segment['blocks']
+
+    if not blocks or blocks[-1][3] >= block_size:
+        blocks.append([offset, timestamp, timestamp, 0])
+
+    block = blocks[-1]
+    block[1] = min(block[1], timestamp)
+    block[2] = max(block[2], timestamp)
+    block[3] += 1
+
+    segment['count'] += 1
+    segment['t_min'] = timestamp if segment['t_min'] is None else min(segment['t_min'], timestamp)
+    segment['t_max'] = timestamp if segment['t_max'] is None else max(segment['t_max'], timestamp)
+    segment['tags'].add(module_tag)
+    segment['levels'].add(level_str)
+
+
+def _index_path(segment_path):
+    return segment_path[:-len('.log')] + '.idx'
+
+
+def _overlaps(t_min, t_max, t_start, t_stop):
+    if t_min is None:
+        # Empty segment
+        return False
+
+    return (t_start is None or t_max >= t_start) and (t_stop is None or t_min <= t_stop)
@@ -1,5 +1,14 @@
 import rpyc
+import sys
+import time
+import atexit
+import weakref
+import threading
 import traceback
+import collections
+
+from pylabnet.utils.logging.datagram import DatagramSender, DatagramReceiver
+from pylabnet.utils.logging.log_buffer import LogBuffer, ViewerDropped
 
 
 class LogHandler:
@@ -19,6 +28,13 @@ class LogHandler:
     Such exceptions can break the host module. Since logging is not
     necessary for module operation, it is better to ignore them and
     do not disturb the module.
+
+    Messages can be given as a str.format() template plus arguments:
+
+        self.log.warn('get_count_ar(): timed out after {} s', timeout)
+
+    The template is formatted only if the logger level lets the message
+    through (no formatting cost for filtered-out messages in hot loops).
     """
 
     def __init__(self, logger=None):
@@ -28,39 +44,32 @@ class LogHandler:
     def set_logger(self, logger):
         self._logger = logger
 
-    def debug(self, msg_str):
-        try:
-            return self._logger.debug(msg_str=msg_str)
-        except:
-            return -1
+    def debug(self, msg_str, *args):
+        return self._call('debug', msg_str, args)
 
-    def info(self, msg_str):
-        try:
-            return self._logger.info(msg_str=msg_str)
-        except:
-            return -1
+    def info(self, msg_str, *args):
+        return self._call('info', msg_str, args)
 
-    def warn(self, msg_str):
-        try:
-            return self._logger.warn(msg_str=msg_str)
-        except:
-            return -1
+    def warn(self, msg_str, *args):
+        return self._call('warn', msg_str, args)
 
-    def error(self, msg_str):
-        try:
-            return self._logger.error(msg_str=msg_str)
-        except:
-            return -1
+    def error(self, msg_str, *args):
+        return self._call('error', msg_str, args)
 
-    def exception(self, msg_str):
-        try:
-            return self._logger.exception(msg_str=msg_str)
-        except:
-            return -1
+    def exception(self, msg_str, *args):
+        return self._call('exception', msg_str, args)
+
+    def critical(self, msg_str, *args):
+        return self._call('critical', msg_str, args)
 
-    def critical(self, msg_str):
+    def _call(self, method_name, msg_str, args):
         try:
-            return self._logger.critical(msg_str=msg_str)
+            log_method = getattr(self._logger, method_name)
+
+            if args:
+                return log_method(msg_str, *args)
+            else:
+                return log_method(msg_str=msg_str)
         except:
             return -1
 
@@ -80,7 +89,48 @@ class LogClient:
         DEBUG=10
     )
 
-    def __init__(self, host, port, module_tag='', level_str='INFO'):
+    # Max delay [s] between attempts to resend a batch after a failure
+    retry_max_delay = 10
+
+    def __init__(self, host, port, module_tag='', level_str='INFO',
+                 batched=False, max_queue=10000, batch_size=100, flush_interval=0.1,
+                 rate_limit=None, transport='rpyc', unix_path=None):
+        """
+
+        :param host: (str) log server host. None - no logging
+                     ('unix' transport: optional, only used by query())
+        :param port: (int) log server port. None - no logging
+                     ('unix' transport: optional, only used by query())
+        :param module_tag: (str) module alias to display with log messages
+        :param level_str: (str) log level: 'DEBUG', 'INFO', 'WARN',
+                          'ERROR', 'CRITICAL' or 'NOLOG'
+        :param batched: (bool) queue-backed mode: log calls only put a record
+                        into the queue (no network round trip), a background
+                        thread sends queued records in batches.
+                        False - each log call is sent synchronously
+        :param max_queue: (int) [batched] max number of queued records.
+                          If the queue is full, the oldest record is dropped
+                          (see get_dropped())
+        :param batch_size: (int) [batched] max number of records per batch.
+                           Sending starts as soon as batch_size records are queued
+        :param flush_interval: (float) [batched] max time [s] a record waits
+                               in the queue before sending
+        :param rate_limit: (float) [optional] period [s] of per-call-site
+                           deduplication: only the first message from a given
+                           line of code is sent within the period, repeats are
+                           collapsed into one "message ×N in T s" record.
+                           None - send every message
+        :param transport: (str) how records are delivered to the log server:
+                          'rpyc' - RPyC calls (default),
+                          'udp' - fire-and-forget UDP datagrams to host:port,
+                          'unix' - fire-and-forget datagrams to local Unix socket
+                          unix_path.
+                          Datagram transports never block or raise, records
+                          which cannot be sent are lost. The log server must
+                          listen for datagrams (see LogService.start_datagram_listener())
+        :param unix_path: (str) ['unix' transport] socket path of the log server
+                          (required)
+        """
 
         # Declare all internal vars
         self._host = ''
@@ -89,20 +139,62 @@ class LogClient:
         self._service = None
         self._level_str = ''
         self._level = 0
-        self._module_taga = ''
+        self._module_tag = ''
+
+        # Datagram transport
+        if transport not in ('rpyc', 'udp', 'unix'):
+            raise ValueError('Unknown log transport "{}"'.format(transport))
+        if transport == 'unix' and unix_path is None:
+            raise ValueError('LogClient(): unix_path is required for "unix" transport')
+        self._transport = transport
+        self._unix_path = unix_path
+        self._sender = None
+
+        # Queue of records for batched mode:
+        #   record = (timestamp, level_str, module_tag, msg_str)
+        self._batched = batched
+        self._queue = collections.deque()
+        self._queue_cond = threading.Condition()
+        self._max_queue = max_queue
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        #   number of records dropped due to queue overflow
+        self._dropped = 0
+        #   number of records taken by the flush thread and not sent yet
+        self._in_flight = 0
+        #   number of threads waiting in flush()
+        self._flush_waiters = 0
+        self._stop_flag = False
+        self._flush_thread = None
+
+        # Per-call-site deduplication
+        if rate_limit is not None:
+            self._rate_limiter = _RateLimiter(period=rate_limit)
+        else:
+            self._rate_limiter = None
 
         # Set log level
         self.set_level(level_str=level_str)
 
         # Connect to log server
         #   This call must be performed after set_level() call:
-        #       if host is None or port is None, connect() call
-        #       will automatically set _level_str to 'NOLOG'
+        #       if host is None or port is None (and transport is not 'unix'),
+        #       connect() call will automatically set _level_str to 'NOLOG'
         self.connect(host=host, port=port)
 
         # Set module alias to display with log messages
         self._module_tag = module_tag
 
+        if batched and self._level_str != 'NOLOG':
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop,
+                daemon=True
+            )
+            self._flush_thread.start()
+
+            # Queued records are sent before interpreter exit
+            _batched_clients.add(self)
+
         # Log test message
         self.info('Started logging. Level: {}'.format(level_str))
 
@@ -124,14 +216,35 @@ class LogClient:
             self._service = None
             self._connection = None
 
+        if self._sender is not None:
+            self._sender.close()
+            self._sender = None
+
         # Establish connection if
-        if host is None or port is None:
+        if self._transport == 'unix':
+            # Local socket path is the only address needed
+            self._sender = DatagramSender(
+                transport=self._transport,
+                path=self._unix_path
+            )
+            return 0
+
+        elif self._host is None or self._port is None:
             # 'No logging' was requested.
             #   Do not establish connection to log server and
             #   set level to 'NOLOG' to stop generating log messages
             self.set_level(level_str='NOLOG')
             return 0
 
+        elif self._transport == 'udp':
+            # Connectionless: only a local socket is created
+            self._sender = DatagramSender(
+                transport=self._transport,
+                host=self._host,
+                port=self._port
+            )
+            return 0
+
         else:
             # Connect to log server
             try:
@@ -149,6 +262,118 @@ class LogClient:
 
                 raise exc_obj
 
+    def flush(self, timeout=5):
+        """Wait until all queued records are sent (batched mode)
+
+        :param timeout: (float) max waiting time [s]. None - wait infinitely
+        :return: 0 - all records were sent, -1 - timeout elapsed
+        """
+
+        # Pending "message ×N" summaries
+        self._emit_summaries(expired_only=False)
+
+        flush_thread = self._flush_thread
+
+        if flush_thread is None:
+            return 0
+
+        with self._queue_cond:
+            self._flush_waiters += 1
+            self._queue_cond.notify_all()
+
+            try:
+                flushed = self._queue_cond.wait_for(
+                    lambda: (not self._queue and self._in_flight == 0) or not flush_thread.is_alive(),
+                    timeout=timeout
+                )
+            finally:
+                self._flush_waiters -= 1
+
+        return 0 if flushed and not self._queue else -1
+
+    def close(self, timeout=5):
+        """Send queued records (batched mode), stop the background thread
+        and close the connection
+
+        :param timeout: (float) max time [s] to wait for queued records to be sent
+        :return: 0
+        """
+
+        self._emit_summaries(expired_only=False)
+
+        if self._flush_thread is not None:
+            with self._queue_cond:
+                self._stop_flag = True
+                self._queue_cond.notify_all()
+
+            self._flush_thread.join(timeout)
+            self._flush_thread = None
+            _batched_clients.discard(self)
+
+        try:
+            self._connection.close()
+        except:
+            pass
+
+        self._connection = None
+        self._service = None
+
+        if self._sender is not None:
+            self._sender.close()
+            self._sender = None
+
+        return 0
+
+    def query(self, t_start=None, t_stop=None, tags=None, min_level=None,
+              substring=None, limit=1000):
+        """Find records stored by the log server
+
+        :param t_start: (float) [optional] min timestamp (time.time() scale)
+        :param t_stop: (float) [optional] max timestamp
+        :param tags: (str or tuple of str) [optional] module tag(s)
+        :param min_level: (str) [optional] min level, e.g. 'WARN'
+        :param substring: (str) [optional] message substring
+        :param limit: (int) max number of returned records. None - no limit
+        :return: (list) records (timestamp, level_str, module_tag, msg_str)
+        """
+
+        query_kwargs = dict(
+            t_start=t_start,
+            t_stop=t_stop,
+            tags=tags if tags is None or isinstance(tags, str) else tuple(tags),
+            min_level=min_level,
+            substring=substring,
+            limit=limit
+        )
+
+        if self._transport != 'rpyc':
+            # Datagrams are one-way: queries go over a temporary RPyC connection
+            if self._host is None or self._port is None:
+                raise ValueError('query(): log server host and port are not given')
+
+            connection = rpyc.connect(host=self._host, port=self._port)
+            try:
+                return [
+                    tuple(record) for record in connection.root.exposed_query_logs(**query_kwargs)
+                ]
+            finally:
+                connection.close()
+
+        if self._service is None:
+            self.connect()
+
+        return [
+            tuple(record) for record in self._service.exposed_query_logs(**query_kwargs)
+        ]
+
+    def get_dropped(self):
+        """
+        :return: (int) number of records dropped due to queue overflow (batched mode)
+                 or which could not be sent (datagram transport)
+        """
+
+        return self._dropped
+
     def set_level(self, level_str):
         # Sanity check
         if level_str not in self._level_dict:
@@ -159,49 +384,93 @@ class LogClient:
 
         return 0
 
-    def debug(self, msg_str):
+    def debug(self, msg_str, *args):
         return self._log_msg(
             msg_str=msg_str,
-            level_str='DEBUG'
+            level_str='DEBUG',
+            args=args
         )
 
-    def info(self, msg_str):
+    def info(self, msg_str, *args):
         return self._log_msg(
             msg_str=msg_str,
-            level_str='INFO'
+            level_str='INFO',
+            args=args
         )
 
-    def warn(self, msg_str):
+    def warn(self, msg_str, *args):
         return self._log_msg(
             msg_str=msg_str,
-            level_str='WARN'
+            level_str='WARN',
+            args=args
         )
 
-    def error(self, msg_str):
+    def error(self, msg_str, *args):
         return self._log_msg(
             msg_str=msg_str,
-            level_str='ERROR'
+            level_str='ERROR',
+            args=args
         )
 
-    def exception(self, msg_str):
+    def exception(self, msg_str, *args):
+        if self._level_dict['ERROR'] < self._level:
+            return 0
+
         # Get traceback string from the last exception
         tb_str = traceback.format_exc()
 
         # Prepend user-give message
-        full_msg_str = msg_str + '\n' + tb_str
+        full_msg_str = _format_msg(msg_str, args) + '\n' + tb_str
 
         return self.error(msg_str=full_msg_str)
 
-    def critical(self, msg_str):
+    def critical(self, msg_str, *args):
         return self._log_msg(
             msg_str=msg_str,
-            level_str='CRITICAL'
+            level_str='CRITICAL',
+            args=args
         )
 
-    def _log_msg(self, msg_str, level_str):
+    def _log_msg(self, msg_str, level_str, args=()):
 
         if self._level_dict[level_str] < self._level:
-            # No need to send the message
+            # No need to send (and to format) the message
+            return 0
+
+        if self._rate_limiter is not None:
+            send, summary = self._rate_limiter.check(
+                site=_call_site(),
+                level_str=level_str,
+                msg_str=msg_str,
+                args=args
+            )
+
+            if summary is not None:
+                self._emit(*summary)
+
+            if not send:
+                # Repeat within the period: only counted
+                return 0
+
+        return self._emit(
+            msg_str=_format_msg(msg_str, args),
+            level_str=level_str
+        )
+
+    def _emit(self, msg_str, level_str):
+
+        if self._flush_thread is not None:
+            # Batched mode: the background thread sends the record
+            return self._enqueue(
+                (time.time(), level_str, self._module_tag, msg_str)
+            )
+
+        elif self._sender is not None:
+            # Datagram transport: fire and forget
+            lost = self._sender.send(
+                records=[(time.time(), level_str, self._module_tag, msg_str)]
+            )
+            self._dropped += lost
             return 0
 
         else:
@@ -243,8 +512,401 @@ class LogClient:
                 )
                 return ret_code
 
+    # Batched mode
+
+    def _enqueue(self, record):
+
+        with self._queue_cond:
+            # Drop the oldest record if the queue is full
+            if len(self._queue) >= self._max_queue:
+                self._queue.popleft()
+                self._dropped += 1
+
+            self._queue.append(record)
+
+            if len(self._queue) >= self._batch_size:
+                self._queue_cond.notify_all()
+
+        return 0
+
+    def _emit_summaries(self, expired_only=True):
+        if self._rate_limiter is None:
+            return
+
+        for summary in self._rate_limiter.pop_summaries(expired_only=expired_only):
+            try:
+                self._emit(*summary)
+            except Exception:
+                pass
+
+    def _flush_loop(self):
+
+        retry_delay = self._flush_interval
+
+        while True:
+
+            # Summaries of call sites which stopped repeating
+            self._emit_summaries()
+
+            with self._queue_cond:
+                # Wait until a full batch is collected, flush is requested,
+                # or flush_interval elapses
+                if not (
+                    len(self._queue) >= self._batch_size
+                    or self._flush_waiters
+                    or self._stop_flag
+                ):
+                    self._queue_cond.wait(self._flush_interval)
+
+                if not self._queue:
+                    if self._stop_flag:
+                        return
+                    continue
+
+                batch = [
+                    self._queue.popleft()
+                    for _ in range(min(self._batch_size, len(self._queue)))
+                ]
+                self._in_flight = len(batch)
+
+            sent = self._send_batch(batch=batch)
+
+            with self._queue_cond:
+                self._in_flight = 0
+
+                if not sent:
+                    if self._stop_flag:
+                        # Log server is not available on exit: give up
+                        self._dropped += len(batch) + len(self._queue)
+                        self._queue.clear()
+                        self._queue_cond.notify_all()
+                        return
+
+                    # Put the batch back in front of the queue
+                    # (the oldest records are dropped on overflow)
+                    self._queue.extendleft(reversed(batch))
+                    while len(self._queue) > self._max_queue:
+                        self._queue.popleft()
+                        self._dropped += 1
+
+                self._queue_cond.notify_all()
+
+            if sent:
+                retry_delay = self._flush_interval
+            else:
+                # Back off exponentially while the log server is not available
+                with self._queue_cond:
+                    self._queue_cond.wait_for(lambda: self._stop_flag, timeout=retry_delay)
+                retry_delay = min(2 * retry_delay, self.retry_max_delay)
+
+    def _send_batch(self, batch):
+        """Send batch of records to the log server (from the flush thread)
+
+        :return: (bool) True if the batch was sent
+        """
+
+        if self._sender is not None:
+            # Datagram transport: undelivered records are not retried
+            lost = self._sender.send(records=batch)
+            with self._queue_cond:
+                self._dropped += lost
+            return True
+
+        try:
+            if self._service is None:
+                self.connect()
+
+            try:
+                send_records = self._service.exposed_log_msgs
+            except AttributeError:
+                # Log server does not accept batches: one call per record
+                for record in batch:
+                    self._service.exposed_log_msg(
+                        msg_str=format_record(record),
+                        level_str=record[1]
+                    )
+                return True
+
+            # Records contain only immutable built-in types:
+            # the whole batch is passed by value in one request
+            send_records(records=tuple(batch))
+            return True
+
+        except Exception:
+            # Reconnect on the next attempt
+            try:
+                self._connection.close()
+            except:
+                pass
+
+            self._connection = None
+            self._service = None
+
+            return False
+
+
+class _RateLimiter:
+    """Per-call-site deduplication of log messages (see LogClient rate_limit)"""
+
+    def __init__(self, period):
+        self._period = period
+        self._lock = threading.Lock()
+
+        # {call_site: [window_start, repeat_n, level_str, msg_str, args]}
+        #   level, template and arguments of the last repeat
+        self._sites = dict()
+
+    def check(self, site, level_str, msg_str, args):
+        """Register a message from the call site
+
+        :return: (tuple) (send, summary):
+                 send - (bool) the message should be sent,
+                 summary - None or (msg_str, level_str) summary of repeats
+                 collapsed in the previous period
+        """
+
+        now = time.time()
+
+        with self._lock:
+            entry = self._sites.get(site)
+
+            if entry is not None and now - entry[0] < self._period:
+                entry[1] += 1
+                entry[2:] = [level_str, msg_str, args]
+                return False, None
+
+            self._sites[site] = [now, 0, level_str, msg_str, args]
+
+        return True, _summary(entry, now)
+
+    def pop_summaries(self, expired_only=True):
+        """
+        :param expired_only: (bool) only call sites, whose period is over
+        :return: (list) summaries (msg_str, level_str) of collapsed repeats
+        """
+
+        now = time.time()
+        summary_list = []
+
+        with self._lock:
+            for site, entry in list(self._sites.items()):
+                if entry[1] == 0 or (expired_only and now - entry[0] < self._period):
+                    continue
+
+                summary_list.append(_summary(entry, now))
+                del self._sites[site]
+
+        return summary_list
+
+
+def _summary(entry, now):
+    if entry is None or entry[1] == 0:
+        return None
+
+    window_start, repeat_n, level_str, msg_str, args = entry
+
+    return (
+        '{0} \u00d7{1} in {2:.1f} s'.format(_format_msg(msg_str, args), repeat_n, now - window_start),
+        level_str
+    )
+
+
+def _format_msg(msg_str, args):
+    """Format message template (deferred formatting)"""
+
+    if not args:
+        return msg_str
+
+    try:
+        return msg_str.format(*args)
+    except Exception:
+        # Logging must not break the caller
+        return '{0} {1}'.format(msg_str, args)
+
+
+def _call_site():
+    """(file name, line number) of the code which called the logger"""
+
+    frame = sys._getframe(1)
+
+    # Skip frames of this module (LogHandler, LogClient)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+
+    if frame is None:
+        return None
+
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+def format_record(record):
+    """Format log record into message string
+
+    :param record: (tuple) (timestamp, level_str, module_tag, msg_str)
+    :return: (str) message string
+    """
+
+    _, level_str, module_tag, msg_str = record
+
+    return '[{0}] {1}: {2}'.format(level_str, module_tag, msg_str)
+
+
+def parse_message(msg_str, level_str):
+    """Build record from the message string formatted by LogClient
+    in synchronous mode ('[LEVEL] tag: message')
+
+    :return: (tuple) (timestamp, level_str, module_tag, msg_str)
+    """
+
+    prefix = '[{}] '.format(level_str)
+
+    if msg_str.startswith(prefix) and ': ' in msg_str:
+        module_tag, _, msg_str = msg_str[len(prefix):].partition(': ')
+    else:
+        module_tag = ''
+
+    return time.time(), level_str, module_tag, msg_str
+
+
+# LogClients in batched mode, which have to send queued records before exit
+_batched_clients = weakref.WeakSet()
+
+# Max total time [s] to wait for them at exit (shared by all clients:
+# with the log server down, exit is not delayed per client)
+EXIT_FLUSH_TIMEOUT = 5
+
+
+@atexit.register
+def _flush_batched_clients():
+    deadline = time.monotonic() + EXIT_FLUSH_TIMEOUT
+
+    # Flush threads of all clients send in parallel meanwhile
+    for log_client in list(_batched_clients):
+        try:
+            log_client.flush(timeout=max(0, deadline - time.monotonic()))
+        except Exception:
+            pass
+
+
+class LogViewer:
+    """Live view of the log server records (see LogService buffer_size)
+
+    Each viewer has its own position and filter on the server:
+
+        viewer = LogViewer(host='localhost', port=12345, min_level='WARN')
+        for record in viewer.follow():
+            print(format_record(record))
+
+    A viewer which does not keep up with the log rate is dropped by the server
+    (records are never held back for it): read() raises ViewerDropped,
+    follow() re-subscribes and reports the gap.
+    """
+
+    def __init__(self, host, port, min_level=None, tags=None, backlog=0):
+        """
+
+        :param host: (str) log server host
+        :param port: (int) log server port
+        :param min_level: (str) [optional] min level, e.g. 'WARN'
+        :param tags: (str or tuple of str) [optional] module tag(s)
+        :param backlog: (int) number of already buffered records to start from
+        """
+
+        self._min_level = min_level
+        self._tags = tags if tags is None or isinstance(tags, str) else tuple(tags)
+
+        self._connection = rpyc.connect(host=host, port=port)
+        self._service = self._connection.root
+        self._viewer_id = None
+
+        self._subscribe(backlog=backlog)
+
+    def read(self, max_records=500, timeout=1.0):
+        """Next batch of records
+
+        :param max_records: (int) max number of records in the batch
+        :param timeout: (float) [s] max waiting time for new records
+        :return: (list) records (timestamp, level_str, module_tag, msg_str).
+                 Empty list - no records within timeout
+        :raises ViewerDropped: viewer lagged behind and was dropped by the server
+        """
+
+        batch = self._service.exposed_read_viewer(
+            viewer_id=self._viewer_id,
+            max_records=max_records,
+            timeout=timeout
+        )
+
+        if batch is None:
+            raise ViewerDropped('Log viewer was dropped by the log server')
+
+        return [tuple(record) for record in batch]
+
+    def follow(self, max_records=500, timeout=1.0):
+        """Generator of records, infinite
+
+        If the viewer gets dropped, it re-subscribes and yields
+        a WARN record about the gap.
+        """
+
+        while True:
+            try:
+                batch = self.read(max_records=max_records, timeout=timeout)
+            except ViewerDropped:
+                self._subscribe(backlog=0)
+                batch = [(time.time(), 'WARN', 'LogViewer', 'Viewer was too slow, some records were skipped')]
+
+            for record in batch:
+                yield record
+
+    def close(self):
+        try:
+            self._service.exposed_unsubscribe_viewer(viewer_id=self._viewer_id)
+        except Exception:
+            pass
+
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+
+        return 0
+
+    def _subscribe(self, backlog):
+        self._viewer_id = self._service.exposed_subscribe_viewer(
+            min_level=self._min_level,
+            tags=self._tags,
+            backlog=backlog
+        )
+
 
 class LogService(rpyc.Service):
+
+    def __init__(self, storage=None, echo=True, buffer_size=10000):
+        """
+
+        :param storage: (LogStorage) [optional] persistent storage of records
+                        (see pylabnet.utils.logging.log_storage)
+        :param echo: (bool) print messages to the console
+        :param buffer_size: (int) number of recent records kept in memory
+                            for live viewers (see LogViewer). 0 - no viewers
+        """
+
+        super().__init__()
+
+        self._storage = storage
+        self._echo = echo
+
+        if buffer_size:
+            self._buffer = LogBuffer(size=buffer_size)
+        else:
+            self._buffer = None
+
+        # DatagramReceivers (see start_datagram_listener())
+        self._receivers = []
+        # Receiver threads and RPyC calls store records concurrently
+        self._records_lock = threading.Lock()
+
     def on_connect(self, conn):
         # code that runs when a connection is created
         # (to init the service, if needed)
@@ -256,5 +918,113 @@ class LogService(rpyc.Service):
         print('[LOG INFO] Client disconnected')
 
     def exposed_log_msg(self, msg_str, level_str):
-        print(msg_str)
+        return self._log_records(
+            records=[parse_message(msg_str=msg_str, level_str=level_str)]
+        )
+
+    def exposed_log_msgs(self, records):
+        """Log batch of records (see LogClient batched mode)
+
+        :param records: (tuple) of records (timestamp, level_str, module_tag, msg_str)
+        :return: 0
+        """
+
+        return self._log_records(records=records)
+
+    def exposed_query_logs(self, t_start=None, t_stop=None, tags=None, min_level=None,
+                           substring=None, limit=1000):
+        """Find stored records (see LogStorage.query())
+
+        :return: (tuple) of records (timestamp, level_str, module_tag, msg_str)
+        """
+
+        if self._storage is None:
+            raise RuntimeError('query_logs(): log server has no storage')
+
+        # Tuple of immutable records is passed by value in one go
+        return tuple(
+            self._storage.query(
+                t_start=t_start,
+                t_stop=t_stop,
+                tags=tags,
+                min_level=min_level,
+                substring=substring,
+                limit=limit
+            )
+        )
+
+    def exposed_subscribe_viewer(self, min_level=None, tags=None, backlog=0):
+        """Register a live viewer (see LogBuffer.subscribe())
+
+        :return: (int) viewer id
+        """
+
+        if self._buffer is None:
+            raise RuntimeError('subscribe_viewer(): log server has no buffer for viewers')
+
+        return self._buffer.subscribe(min_level=min_level, tags=tags, backlog=backlog)
+
+    def exposed_read_viewer(self, viewer_id, max_records=500, timeout=1.0):
+        """Next batch of records for the viewer (see LogBuffer.read())
+
+        :return: (tuple) of records. None - viewer was dropped
+        """
+
+        try:
+            return tuple(
+                self._buffer.read(viewer_id=viewer_id, max_records=max_records, timeout=timeout)
+            )
+        except ViewerDropped:
+            return None
+
+    def exposed_unsubscribe_viewer(self, viewer_id):
+        return self._buffer.unsubscribe(viewer_id=viewer_id)
+
+    def start_datagram_listener(self, transport='udp', host='localhost', port=None, path=None):
+        """Accept records from LogClients with datagram transport
+
+        Received records go to the same console output and storage
+        as records received over RPyC.
+
+        :param transport: (str) 'udp' or 'unix'
+        :param host: (str) [udp] address to listen on
+        :param port: (int) [udp] port to listen on (can be the same as
+                     the RPyC server port)
+        :param path: (str) [unix] socket path to listen on
+        :return: 0
+        """
+
+        self._receivers.append(
+            DatagramReceiver(
+                on_records=self._log_records,
+                transport=transport,
+                host=host,
+                port=port,
+                path=path
+            )
+        )
+
+        return 0
+
+    def stop_datagram_listeners(self):
+        while self._receivers:
+            self._receivers.pop().stop()
+
+        return 0
+
+    def _log_records(self, records):
+        # Local copy (records normally arrive by value already)
+        records = [tuple(record) for record in records]
+
+        if self._buffer is not None:
+            self._buffer.append(records=records)
+
+        with self._records_lock:
+            if self._echo:
+                for record in records:
+                    print(format_record(record))
+
+            if self._storage is not None:
+                self._storage.append(records=records)
+
         return 0
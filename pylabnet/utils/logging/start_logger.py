@@ -1,12 +1,23 @@
 import sys
 sys.path.append(r'C:\Users\Lukin SiV\pylabnet')
 from pylabnet.utils.logging.logger import LogService
+from pylabnet.utils.logging.log_storage import LogStorage
 from pylabnet.core.generic_server import GenericServer
 
 if __name__ == '__main__':
     host = str(sys.argv[1])
     port = int(sys.argv[2])
 
-    log_service = LogService()
+    # Optional: directory for persistent log storage
+    if len(sys.argv) > 3:
+        storage = LogStorage(dir_path=sys.argv[3])
+    else:
+        storage = None
+
+    log_service = LogService(storage=storage)
+
+    # LogClients with transport='udp' send datagrams to the same host:port
+    log_service.start_datagram_listener(transport='udp', host=host, port=port)
+
     log_server = GenericServer(service=log_service, host=host, port=port)
     log_server.start()
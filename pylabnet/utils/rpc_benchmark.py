@@ -0,0 +1,225 @@
+""" RPC latency and throughput benchmark built on the RNG test service.
+
+Starts GenericServer with RNGService on localhost in a separate process
+and sweeps payload size, number of simultaneously active clients and
+call rate for each transport mode:
+
+    'pickle' - exposed_get_test_array(): array is pickled into bytes
+    'raw'    - exposed_get_test_array_buf(): array envelope (raw buffer)
+    'shm'    - exposed_get_test_array_buf() with shared memory transport
+
+For each point, p50/p99 latency, MB/s and calls/s are reported and all
+results are written into a JSON file.
+
+Usage:
+    python rpc_benchmark.py [out_file] [port]
+"""
+
+import sys
+import json
+import time
+import threading
+import multiprocessing
+import numpy as np
+from pylabnet.hardware.rng import RNG, RNGService, RNGClient
+from pylabnet.core.generic_server import GenericServer
+
+
+MODES = ('pickle', 'raw', 'shm')
+
+
+def run_benchmark(port=18900, sizes=(10, 10**4, 10**6), client_numbers=(1, 4),
+                  call_rates=(None, 100), modes=MODES, call_number=100,
+                  out_file='rpc_benchmark.json'):
+    """Run the full sweep and write results into a JSON file
+
+    :param port: (int) port for the benchmark server on localhost
+    :param sizes: (list of int) payload sizes [number of float64 elements]
+    :param client_numbers: (list of int) numbers of simultaneously active clients
+    :param call_rates: (list) target call rates per client [calls/s]
+                        None - back-to-back calls
+    :param modes: (list of str) transport modes, see MODES
+    :param call_number: (int) number of calls per client for each point
+    :param out_file: (str) path to the output JSON file.
+                     None - do not write results into file
+
+    :return: (list of dict) results, one dict per point
+    """
+
+    server_proc = multiprocessing.Process(
+        target=_serve,
+        args=('localhost', port),
+        daemon=True
+    )
+    server_proc.start()
+
+    try:
+        _wait_for_server(port=port)
+
+        results = []
+
+        for size in sizes:
+
+            # Generate payload once for all modes
+            ctl_client = RNGClient(host='localhost', port=port)
+            ctl_client.generate_test_array(size=size)
+            ctl_client.close()
+
+            for mode in modes:
+                for client_number in client_numbers:
+                    for call_rate in call_rates:
+
+                        res_dict = measure(
+                            port=port,
+                            mode=mode,
+                            client_number=client_number,
+                            call_rate=call_rate,
+                            call_number=call_number
+                        )
+                        res_dict['size'] = size
+                        results.append(res_dict)
+
+                        print(_format_line(res_dict))
+
+        if out_file is not None:
+            with open(out_file, 'w') as json_file:
+                json.dump(results, json_file, indent=2)
+
+        return results
+
+    finally:
+        server_proc.terminate()
+        server_proc.join()
+
+
+def measure(port, mode, client_number, call_rate, call_number):
+    """Measure one point of the sweep
+
+    :param port: (int) server port
+    :param mode: (str) transport mode, see MODES
+    :param client_number: (int) number of simultaneously active clients
+    :param call_rate: (float) target call rate per client [calls/s], None - back-to-back
+    :param call_number: (int) number of calls per client
+
+    :return: (dict) measured latency and throughput
+    """
+
+    clients = [
+        RNGClient(host='localhost', port=port, shm=(mode == 'shm'))
+        for _ in range(client_number)
+    ]
+
+    if mode == 'pickle':
+        call_name = 'get_test_array'
+    else:
+        call_name = 'get_test_array_buf'
+
+    # Warm-up call: resolve remote methods, determine payload size
+    payload_bytes = getattr(clients[0], call_name)().nbytes
+
+    latency_lists = [[] for _ in clients]
+    start_barrier = threading.Barrier(client_number + 1)
+
+    threads = [
+        threading.Thread(
+            target=_client_loop,
+            args=(getattr(client, call_name), call_rate, call_number, latency_list, start_barrier)
+        )
+        for client, latency_list in zip(clients, latency_lists)
+    ]
+    for thread in threads:
+        thread.start()
+
+    start_barrier.wait()
+    start_time = time.perf_counter()
+
+    for thread in threads:
+        thread.join()
+
+    wall_time = time.perf_counter() - start_time
+
+    for client in clients:
+        client.close()
+
+    latency_ar = np.concatenate([np.asarray(lst) for lst in latency_lists])
+    total_calls = len(latency_ar)
+
+    return dict(
+        mode=mode,
+        client_number=client_number,
+        call_rate=call_rate,
+        call_number=call_number,
+        payload_bytes=int(payload_bytes),
+        p50_latency=float(np.percentile(latency_ar, 50)),
+        p99_latency=float(np.percentile(latency_ar, 99)),
+        calls_per_sec=total_calls / wall_time,
+        mb_per_sec=total_calls * payload_bytes / wall_time / 1e6
+    )
+
+
+def _client_loop(call_func, call_rate, call_number, latency_list, start_barrier):
+
+    period = 0 if call_rate is None else 1 / call_rate
+
+    start_barrier.wait()
+    next_call_time = time.perf_counter()
+
+    for _ in range(call_number):
+
+        # Keep the target call rate
+        delay = next_call_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        next_call_time += period
+
+        t_start = time.perf_counter()
+        call_func()
+        latency_list.append(time.perf_counter() - t_start)
+
+
+def _serve(host, port):
+
+    rng = RNG()
+
+    rng_service = RNGService()
+    rng_service.assign_module(module=rng)
+
+    rng_server = GenericServer(service=rng_service, host=host, port=port)
+    rng_server.start()
+
+    # Server thread keeps the process alive until terminate()
+
+
+def _wait_for_server(port, timeout=10):
+
+    start_time = time.time()
+
+    while True:
+        try:
+            RNGClient(host='localhost', port=port).close()
+            return 0
+        except Exception:
+            if time.time() - start_time > timeout:
+                raise
+            time.sleep(0.1)
+
+
+def _format_line(res_dict):
+    return (
+        '{mode:>6} size={size:<8} clients={client_number:<3} rate={rate:<6} '
+        'p50={p50:8.3f} ms  p99={p99:8.3f} ms  {calls_per_sec:9.1f} calls/s  {mb_per_sec:9.2f} MB/s'
+        ''.format(
+            rate=str(res_dict['call_rate']),
+            p50=res_dict['p50_latency'] * 1e3,
+            p99=res_dict['p99_latency'] * 1e3,
+            **res_dict
+        )
+    )
+
+
+if __name__ == '__main__':
+
+    out_file = sys.argv[1] if len(sys.argv) > 1 else 'rpc_benchmark.json'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 18900
+
+    run_benchmark(port=port, out_file=out_file)